@@ -7,11 +7,14 @@ from app.cache import redis_client
 from app.config import Config
 from app.email import configure_mail
 from app.models import User, db
+from app.schema import deduplicate_command, sync_schema
+from app.stats import rebuild_quiz_stats_command, rebuild_user_stats_command
 from app.worker import configure_celery
 from flask import Flask, Response
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from flask_migrate import Migrate
+from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.security import generate_password_hash
 
 celery = None
@@ -46,6 +49,9 @@ def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
 
+    if Config.TRUSTED_PROXY_HOPS:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=Config.TRUSTED_PROXY_HOPS)
+
     db.init_app(app)
 
     migrate = Migrate(app, db)
@@ -61,10 +67,15 @@ def create_app():
         print("Redis connected successfully!")
 
         db.create_all()
+        sync_schema()
         create_super_admin()
 
     configure_mail(app)
 
     api.init_app(app)
 
+    app.cli.add_command(rebuild_user_stats_command)
+    app.cli.add_command(rebuild_quiz_stats_command)
+    app.cli.add_command(deduplicate_command)
+
     return app
@@ -0,0 +1,257 @@
+import logging
+from datetime import datetime, timedelta
+
+from app.cache import redis_binary
+from app.codec import decode_value, encode_value
+from app.models import (
+    Chapter,
+    Question,
+    Quiz,
+    QuizStats,
+    Score,
+    Subject,
+    User,
+    UserStats,
+    db,
+)
+from app.timeseries import activity_series
+from sqlalchemy import func, select
+
+# Last computed admin dashboard payload. The beat task rewrites it every few
+# minutes; it is kept for a day so a stalled worker shows old numbers, with
+# their generated_at, rather than making each page load compute them.
+SNAPSHOT_KEY = "admin:dashboard:snapshot"
+SNAPSHOT_TTL = 24 * 60 * 60
+
+TREND_MONTHS = 6
+
+
+def _count(query):
+    return select(func.count()).select_from(query.subquery()).scalar_subquery()
+
+
+def _overview(now):
+    thirty_days_ago = now - timedelta(days=30)
+    seven_days_ago = now - timedelta(days=7)
+
+    counts = db.session.execute(
+        select(
+            _count(select(User.id).where(User.role == "user")),
+            _count(select(User.id).where(User.role == "admin")),
+            _count(select(Quiz.id)),
+            _count(select(Question.id)),
+            _count(select(Score.id)),
+            _count(select(Subject.id)),
+            _count(select(Chapter.id)),
+            _count(
+                select(User.id).where(
+                    User.created_at >= thirty_days_ago, User.role == "user"
+                )
+            ),
+            _count(select(Quiz.id).where(Quiz.date_of_quiz >= seven_days_ago.date())),
+            _count(select(Score.id).where(Score.timestamp >= seven_days_ago)),
+            _count(
+                select(Score.user_id)
+                .where(Score.timestamp >= thirty_days_ago)
+                .distinct()
+            ),
+        )
+    ).one()
+
+    return dict(
+        zip(
+            [
+                "total_users",
+                "total_admins",
+                "total_quizzes",
+                "total_questions",
+                "total_attempts",
+                "total_subjects",
+                "total_chapters",
+                "new_users_30d",
+                "recent_quizzes_7d",
+                "recent_attempts_7d",
+                "active_users_30d",
+            ],
+            counts,
+        )
+    )
+
+
+def _performance(overview):
+    graded_attempts, graded_points, highest_score, lowest_score = db.session.query(
+        func.sum(QuizStats.attempts),
+        func.sum(QuizStats.total_points),
+        func.max(QuizStats.max_score),
+        func.min(QuizStats.min_score),
+    ).one()
+    if graded_attempts:
+        average_score = round(graded_points / graded_attempts, 2)
+    else:
+        average_score = 0
+        highest_score = 0
+        lowest_score = 0
+
+    total_users = overview["total_users"]
+    total_quizzes = overview["total_quizzes"]
+
+    return {
+        "average_score": average_score,
+        "highest_score": highest_score,
+        "lowest_score": lowest_score,
+        "engagement_rate": (
+            round((overview["active_users_30d"] / total_users * 100), 2)
+            if total_users > 0
+            else 0
+        ),
+        "active_users_30d": overview["active_users_30d"],
+        "avg_questions_per_quiz": (
+            round(overview["total_questions"] / total_quizzes, 2)
+            if total_quizzes > 0
+            else 0
+        ),
+        "avg_attempts_per_user": (
+            round(overview["total_attempts"] / total_users, 2) if total_users > 0 else 0
+        ),
+    }
+
+
+def _subject_breakdown():
+    return [
+        {
+            "subject_name": subject_name,
+            "total_quizzes": subject_quizzes,
+            "total_attempts": subject_attempts,
+            "average_score": (
+                round(subject_points / subject_attempts, 2) if subject_attempts else 0
+            ),
+        }
+        for subject_name, subject_quizzes, subject_attempts, subject_points in (
+            db.session.query(
+                Subject.name,
+                func.count(Quiz.id),
+                func.coalesce(func.sum(QuizStats.attempts), 0),
+                func.coalesce(func.sum(QuizStats.total_points), 0),
+            )
+            .outerjoin(Quiz, Quiz.subject_id == Subject.id)
+            .outerjoin(QuizStats, QuizStats.quiz_id == Quiz.id)
+            .group_by(Subject.id, Subject.name)
+            .order_by(Subject.id)
+        )
+    ]
+
+
+def _top_performers():
+    user_average = UserStats.total_points * 1.0 / UserStats.quizzes_taken
+    return [
+        {
+            "username": username,
+            "full_name": full_name,
+            "total_attempts": quizzes_taken,
+            "average_score": round(user_avg, 2),
+        }
+        for username, full_name, quizzes_taken, user_avg in db.session.query(
+            User.username,
+            User.full_name,
+            UserStats.quizzes_taken,
+            user_average,
+        )
+        .join(UserStats, UserStats.user_id == User.id)
+        .filter(User.role == "user", UserStats.quizzes_taken > 0)
+        .order_by(user_average.desc())
+        .limit(10)
+    ]
+
+
+def _popular_quizzes():
+    quiz_attempts = func.coalesce(QuizStats.attempts, 0)
+    return [
+        {
+            "quiz_title": quiz_title,
+            "subject_name": subject_name or "Unknown",
+            "chapter_name": chapter_name or "Unknown",
+            "total_attempts": attempts,
+            "average_score": round(points / attempts, 2) if attempts else 0,
+            "date_created": date_of_quiz.isoformat() if date_of_quiz else None,
+        }
+        for (
+            quiz_title,
+            subject_name,
+            chapter_name,
+            attempts,
+            points,
+            date_of_quiz,
+        ) in db.session.query(
+            Quiz.quiz_title,
+            Subject.name,
+            Chapter.name,
+            quiz_attempts,
+            func.coalesce(QuizStats.total_points, 0),
+            Quiz.date_of_quiz,
+        )
+        .outerjoin(QuizStats, QuizStats.quiz_id == Quiz.id)
+        .outerjoin(Subject, Subject.id == Quiz.subject_id)
+        .outerjoin(Chapter, Chapter.id == Quiz.chapter_id)
+        .order_by(quiz_attempts.desc(), Quiz.id)
+        .limit(10)
+    ]
+
+
+def _monthly_trends(now):
+    first_month = now.date().replace(day=1)
+    for _ in range(TREND_MONTHS - 1):
+        first_month = (first_month - timedelta(days=1)).replace(day=1)
+
+    return [
+        {
+            "month": bucket["period"][:7],
+            "new_users": bucket["new_users"],
+            "quiz_attempts": bucket["attempts"],
+        }
+        for bucket in activity_series(first_month, now.date(), "month")
+    ]
+
+
+def build_admin_dashboard_stats(now=None):
+    """Compute the admin dashboard payload with a fixed number of queries"""
+    now = now or datetime.now()
+
+    overview = _overview(now)
+    performance = _performance(overview)
+    del overview["active_users_30d"]
+
+    return {
+        "overview": overview,
+        "performance": performance,
+        "subject_breakdown": _subject_breakdown(),
+        "top_performers": _top_performers(),
+        "popular_quizzes": _popular_quizzes(),
+        "monthly_trends": _monthly_trends(now),
+        "generated_at": now.isoformat(),
+    }
+
+
+def refresh_admin_dashboard_snapshot():
+    """Recompute the payload and store it as the current snapshot"""
+    stats = build_admin_dashboard_stats()
+
+    try:
+        redis_binary.set(SNAPSHOT_KEY, encode_value(stats), ex=SNAPSHOT_TTL)
+    except Exception as e:
+        print(f"Admin dashboard snapshot write error: {e}")
+
+    logging.info(f"Refreshed admin dashboard snapshot at {stats['generated_at']}")
+    return stats
+
+
+def get_admin_dashboard_snapshot(fresh=False):
+    """Return the stored snapshot, computing one if asked or if none exists"""
+    if not fresh:
+        try:
+            snapshot = redis_binary.get(SNAPSHOT_KEY)
+            if snapshot:
+                return decode_value(snapshot)
+        except Exception as e:
+            print(f"Admin dashboard snapshot read error: {e}")
+
+    return refresh_admin_dashboard_snapshot()
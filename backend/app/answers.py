@@ -0,0 +1,213 @@
+import json
+from datetime import datetime
+
+from app.cache import redis_client
+from app.models import QuizResponse, db, insert_for
+from flask import current_app
+
+# Rows per INSERT statement; keeps bound parameters well under SQLite's limit.
+ANSWER_UPSERT_BATCH_SIZE = 500
+
+
+def upsert_answers(rows):
+    """Insert or update ``QuizResponse`` rows without reading them first.
+
+    Each row is a dict with ``quiz_id``, ``user_id``, ``question_id``,
+    ``selected_option``, ``is_correct`` and ``timestamp``. Conflicts on the
+    unique (quiz, user, question) index overwrite the previous answer, so
+    concurrent submissions of the same question leave exactly one row.
+
+    Returns a dict mapping question id to response id. The caller commits.
+    """
+    response_ids = {}
+
+    for start in range(0, len(rows), ANSWER_UPSERT_BATCH_SIZE):
+        stmt = insert_for(QuizResponse).values(
+            rows[start : start + ANSWER_UPSERT_BATCH_SIZE]
+        )
+        stmt = stmt.on_conflict_do_update(
+            index_elements=["quiz_id", "user_id", "question_id"],
+            set_={
+                "selected_option": stmt.excluded.selected_option,
+                "is_correct": stmt.excluded.is_correct,
+                "timestamp": stmt.excluded.timestamp,
+            },
+        ).returning(QuizResponse.question_id, QuizResponse.id)
+
+        response_ids.update(db.session.execute(stmt).all())
+
+    return response_ids
+
+
+# Write-behind buffer for live quizzes. Answers are stored in one hash per
+# (quiz, user) keyed by question id, and the dirty sets index which hashes
+# still hold answers that have not reached the database.
+BUFFER_KEY = "answers:buffer:{quiz_id}:{user_id}"
+DIRTY_USERS_KEY = "answers:dirty:{quiz_id}"
+DIRTY_QUIZZES_KEY = "answers:dirty"
+
+# Delete only the fields that still hold the value that was flushed, so an
+# answer changed during a flush stays buffered for the next one. The dirty
+# sets are cleared in the same step once nothing is left.
+_RELEASE_SCRIPT = """
+for i = 3, #ARGV, 2 do
+    if redis.call('HGET', KEYS[1], ARGV[i]) == ARGV[i + 1] then
+        redis.call('HDEL', KEYS[1], ARGV[i])
+    end
+end
+if redis.call('HLEN', KEYS[1]) == 0 then
+    redis.call('SREM', KEYS[2], ARGV[1])
+    if redis.call('SCARD', KEYS[2]) == 0 then
+        redis.call('SREM', KEYS[3], ARGV[2])
+    end
+end
+return redis.call('HLEN', KEYS[1])
+"""
+_release_flushed = redis_client.register_script(_RELEASE_SCRIPT)
+
+
+def should_buffer(starts_at, ends_at, now):
+    """Whether answers for a quiz with this window go to the Redis buffer"""
+    return (
+        current_app.config.get("ANSWER_BUFFER_ENABLED", False)
+        and starts_at is not None
+        and ends_at is not None
+        and starts_at <= now < ends_at
+    )
+
+
+def buffer_answers(quiz_id, user_id, rows):
+    """Store answers in the Redis buffer. Returns False if Redis is unavailable.
+
+    The hash write and the dirty-set updates run in one MULTI, so an answer is
+    never acknowledged without also being discoverable by the flusher.
+    """
+    mapping = {
+        str(row["question_id"]): json.dumps(
+            {
+                "selected_option": row["selected_option"],
+                "is_correct": row["is_correct"],
+                "timestamp": row["timestamp"].isoformat(),
+            }
+        )
+        for row in rows
+    }
+
+    try:
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.hset(BUFFER_KEY.format(quiz_id=quiz_id, user_id=user_id), mapping=mapping)
+        pipe.sadd(DIRTY_USERS_KEY.format(quiz_id=quiz_id), user_id)
+        pipe.sadd(DIRTY_QUIZZES_KEY, quiz_id)
+        pipe.execute()
+        return True
+    except Exception as e:
+        print(f"Answer buffer error for quiz {quiz_id}, user {user_id}: {e}")
+        return False
+
+
+def has_buffered_answers():
+    """Cheap check used to skip idle flushes"""
+    return bool(redis_client.scard(DIRTY_QUIZZES_KEY))
+
+
+def stage_buffered_answers(quiz_id):
+    """Upsert the answers buffered for ``quiz_id`` into the session.
+
+    Does not commit and leaves Redis untouched: the caller commits, together
+    with any other writes that must land with the answers, and then passes
+    the returned snapshots to ``release_buffered_answers``. If the commit
+    fails the answers stay buffered, and the upsert is idempotent, so they
+    are simply written again by the next flush.
+
+    Returns ``(snapshots, count)`` with one ``(user_id, fields)`` snapshot
+    per buffered user and the number of answers staged.
+    """
+    user_ids = [
+        int(uid)
+        for uid in redis_client.smembers(DIRTY_USERS_KEY.format(quiz_id=quiz_id))
+    ]
+    if not user_ids:
+        return [], 0
+
+    pipe = redis_client.pipeline(transaction=False)
+    for uid in user_ids:
+        pipe.hgetall(BUFFER_KEY.format(quiz_id=quiz_id, user_id=uid))
+    snapshots = list(zip(user_ids, pipe.execute()))
+
+    rows = []
+    for uid, snapshot in snapshots:
+        for question_id, value in snapshot.items():
+            answer = json.loads(value)
+            rows.append(
+                {
+                    "quiz_id": quiz_id,
+                    "user_id": uid,
+                    "question_id": int(question_id),
+                    "selected_option": answer["selected_option"],
+                    "is_correct": answer["is_correct"],
+                    "timestamp": datetime.fromisoformat(answer["timestamp"]),
+                }
+            )
+
+    upsert_answers(rows)
+    return snapshots, len(rows)
+
+
+def release_buffered_answers(quiz_id, snapshots):
+    """Drop committed answers from the buffer, keeping any changed since.
+
+    Only call after the commit that wrote ``snapshots``. A Redis error here
+    is logged and ignored: the answers are already in the database and stay
+    buffered until a later flush writes them again.
+    """
+    if not snapshots:
+        return
+
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for uid, snapshot in snapshots:
+            args = [uid, quiz_id]
+            for field_value in snapshot.items():
+                args.extend(field_value)
+            _release_flushed(
+                keys=[
+                    BUFFER_KEY.format(quiz_id=quiz_id, user_id=uid),
+                    DIRTY_USERS_KEY.format(quiz_id=quiz_id),
+                    DIRTY_QUIZZES_KEY,
+                ],
+                args=args,
+                client=pipe,
+            )
+        pipe.execute()
+    except Exception as e:
+        print(f"Answer buffer release error for quiz {quiz_id}: {e}")
+
+
+def flush_answer_buffer(quiz_id=None):
+    """Write buffered answers to ``QuizResponse`` and drop them from Redis.
+
+    Flushes one quiz, or every quiz with buffered answers when ``quiz_id`` is
+    None, committing each quiz on its own. Answers are removed from Redis
+    only after the database commit, and the upsert is idempotent, so a crash
+    at any point loses nothing.
+
+    Returns the number of answers written.
+    """
+    if quiz_id is None:
+        quiz_ids = [int(qid) for qid in redis_client.smembers(DIRTY_QUIZZES_KEY)]
+    else:
+        quiz_ids = [quiz_id]
+
+    flushed = 0
+    for qid in quiz_ids:
+        try:
+            snapshots, count = stage_buffered_answers(qid)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            raise
+
+        release_buffered_answers(qid, snapshots)
+        flushed += count
+
+    return flushed
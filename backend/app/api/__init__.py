@@ -9,6 +9,7 @@ from app.api.resource import (
     AdminDashboardStatsResource,
     ChapterResources,
     CheckTokenValidResource,
+    LeaderboardResource,
     MyQuizStats,
     QuestionResources,
     QuizResources,
@@ -17,6 +18,7 @@ from app.api.resource import (
     SubjectResources,
     TakeQuizResource,
     TakeResponseResource,
+    TakeResponsesBatchResource,
     TestPostResource,
     UserDashboardResource,
     UserLoginResource,
@@ -24,6 +26,8 @@ from app.api.resource import (
     UserRegisterResource,
 )
 from app.api.resource.admin import (
+    AdminActivityResource,
+    AdminCacheStatsResource,
     AdminDashboardResource,
     AdminUsersResource,
     ExportUserStatsResource,
@@ -49,7 +53,11 @@ api.add_resource(UserDashboardResource, "/api/dashboard", endpoint="dashboard")
 api.add_resource(ScoresResource, "/api/scores", endpoint="scores")
 api.add_resource(TakeQuizResource, "/api/fetchQuestions", endpoint="fetchQuestions")
 api.add_resource(TakeResponseResource, "/api/takeResponse", endpoint="takeResponse")
+api.add_resource(
+    TakeResponsesBatchResource, "/api/takeResponses", endpoint="takeResponses"
+)
 api.add_resource(ReturnUsersScoreBoard, "/api/scoreboard", endpoint="scoreboard")
+api.add_resource(LeaderboardResource, "/api/leaderboard", endpoint="leaderboard")
 api.add_resource(MyQuizStats, "/api/my_quiz_stats", endpoint="my_quiz_stats")
 
 api.add_resource(
@@ -67,3 +75,9 @@ api.add_resource(
 )
 api.add_resource(ExportUserStatsResource, "/api/admin/export", endpoint="admin_export")
 api.add_resource(AdminUsersResource, "/api/admin/users", endpoint="admin_users_list")
+api.add_resource(
+    AdminActivityResource, "/api/admin/activity", endpoint="admin_activity"
+)
+api.add_resource(
+    AdminCacheStatsResource, "/api/admin/cache/stats", endpoint="admin_cache_stats"
+)
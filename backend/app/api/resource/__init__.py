@@ -1,11 +1,13 @@
 import email
+import json
 import logging
-import select
 import time
 from datetime import datetime, timedelta, timezone
 from operator import ge
 
 import jwt
+from app.admin_dashboard import get_admin_dashboard_snapshot
+from app.answers import buffer_answers, should_buffer, upsert_answers
 from app.api.validators import (
     UserLoginParser,
     UserRegisterParser,
@@ -15,8 +17,14 @@ from app.api.validators import (
     checkTokenParser,
     questions_add_parser,
     take_response_parser,
+    take_responses_batch_parser,
+)
+from app.cache import (
+    bump_collections,
+    cache_response,
+    conditional_get,
+    get_or_compute,
 )
-from app.cache import CacheManager, cache_result, invalidate_cache
 from app.middleware import jwt_auth_required, optional_jwt_auth, role_required
 from app.models import (
     Chapter,
@@ -27,9 +35,35 @@ from app.models import (
     Subject,
     User,
     UserPreference,
+    UserStats,
+    UserSubjectStats,
     db,
 )
-from flask import make_response, request
+from app.quiz_payload import (
+    get_quiz_payload,
+    invalidate_quiz_payload,
+    invalidate_quiz_payloads,
+)
+from app.rankings import (
+    LEADERBOARD_SCOPES,
+    leaderboard_ranks,
+    leaderboard_top,
+    user_average_percentile,
+)
+from app.ratelimit import rate_limit
+from app.scheduler import (
+    cancel_quiz_finalization,
+    cancel_quiz_warmup,
+    schedule_quiz_finalization,
+    schedule_quiz_warmup,
+)
+from app.score_history import SCORE_HISTORY_TAG, decode_cursor, score_history
+from app.timeline import (
+    refresh_timeline_quiz,
+    remove_timeline_quiz,
+    timeline_split,
+)
+from flask import Response, make_response, request
 from flask_jwt_extended import (
     create_access_token,
     get_jwt,
@@ -37,6 +71,7 @@ from flask_jwt_extended import (
     jwt_required,
 )
 from flask_restful import Resource
+from sqlalchemy import func, select
 from werkzeug.security import generate_password_hash
 
 
@@ -79,6 +114,7 @@ class UserLoginResource(Resource):
     def get(self):
         return {"message": "This is a user login resource"}, 200
 
+    @rate_limit()
     def post(self):
         args = UserLoginParser.parse_args()
         username = args["username"]
@@ -197,21 +233,25 @@ class UserLogoutResource(Resource):
 class SubjectResources(Resource):
     @jwt_auth_required
     @optional_jwt_auth
-    # @cache_result()
+    @conditional_get("subjects", "quizzes")
     def get(self):
-        subjects = Subject.query.all()
-        subjects_data = []
+        subjects = (
+            db.session.query(Subject, func.count(Quiz.id))
+            .outerjoin(Quiz, Quiz.subject_id == Subject.id)
+            .group_by(Subject.id)
+            .order_by(Subject.id)
+            .all()
+        )
 
-        for subject in subjects:
-            quiz_count = Quiz.query.filter_by(subject_id=subject.id).count()
-            subjects_data.append(
-                {
-                    "subject_id": subject.id,
-                    "subject_name": subject.name,
-                    "subject_description": subject.description,
-                    "number_of_quizzes": quiz_count,
-                }
-            )
+        subjects_data = [
+            {
+                "subject_id": subject.id,
+                "subject_name": subject.name,
+                "subject_description": subject.description,
+                "number_of_quizzes": quiz_count,
+            }
+            for subject, quiz_count in subjects
+        ]
 
         return {"subjects": subjects_data}, 200
 
@@ -236,7 +276,7 @@ class SubjectResources(Resource):
         db.session.add(new_subject)
         db.session.commit()
 
-        CacheManager.invalidate_subjects_cache()
+        bump_collections("subjects")
 
         return {
             "message": "Subject created successfully",
@@ -281,6 +321,8 @@ class SubjectResources(Resource):
             db.session.add(new_subject)
             db.session.commit()
 
+            bump_collections("subjects")
+
             return {"message": "Subject created successfully"}, 201
 
         except Exception as e:
@@ -298,10 +340,19 @@ class SubjectResources(Resource):
         if not existing_subject:
             return {"message": "Subject not found"}, 404
 
+        # Their cached payloads show the subject name
+        quiz_ids = [
+            quiz_id
+            for (quiz_id,) in db.session.query(Quiz.id).filter(
+                Quiz.subject_id == existing_subject.id
+            )
+        ]
+
         db.session.delete(existing_subject)
         db.session.commit()
 
-        CacheManager.invalidate_subjects_cache()
+        bump_collections("subjects", "chapters", "quizzes")
+        invalidate_quiz_payloads(quiz_ids)
 
         return {"message": "Subject deleted successfully"}, 200
 
@@ -317,38 +368,47 @@ class TestPostResource(Resource):
 
 class ChapterResources(Resource):
     @jwt_auth_required
-    # @cache_result()
+    @conditional_get("chapters", "quizzes")
     def get(self):
         subject_id = request.args.get("subject_id", type=int)
         if not subject_id:
             return {"message": "Missing subject_id in query parameters"}, 400
 
-        cache_key = f"chapters:subject:{subject_id}"
-        cached_data = CacheManager.get_cached_data(cache_key)
-        if cached_data:
-            return cached_data, 200
-
-        chapters = Chapter.query.filter_by(subject_id=subject_id).all()
-        if not chapters:
+        result = get_or_compute(
+            f"chapters:subject:{subject_id}",
+            lambda: self._load_chapters(subject_id),
+            300,
+            tags=("chapters", "quizzes", f"subject:{subject_id}"),
+        )
+        if result is None:
             return {"message": "No chapters found for the given subject"}, 404
 
-        chapters_data = []
-        for chapter in chapters:
-            quiz_count = Quiz.query.filter_by(chapter_id=chapter.id).count()
-            chapters_data.append(
-                {
-                    "id": chapter.id,
-                    "name": chapter.name,
-                    "description": chapter.description,
-                    "number_of_quizzes": quiz_count,
-                }
-            )
+        return result, 200
 
-        result = {"data": {"subject_id": subject_id, "chapters": chapters_data}}
+    @staticmethod
+    def _load_chapters(subject_id):
+        chapters = (
+            db.session.query(Chapter, func.count(Quiz.id))
+            .outerjoin(Quiz, Quiz.chapter_id == Chapter.id)
+            .filter(Chapter.subject_id == subject_id)
+            .group_by(Chapter.id)
+            .order_by(Chapter.id)
+            .all()
+        )
+        if not chapters:
+            return None
 
-        CacheManager.set_cached_data(cache_key, result, 300)
+        chapters_data = [
+            {
+                "id": chapter.id,
+                "name": chapter.name,
+                "description": chapter.description,
+                "number_of_quizzes": quiz_count,
+            }
+            for chapter, quiz_count in chapters
+        ]
 
-        return result, 200
+        return {"data": {"subject_id": subject_id, "chapters": chapters_data}}
 
     @jwt_auth_required
     @role_required(["admin"])
@@ -371,7 +431,7 @@ class ChapterResources(Resource):
         db.session.add(new_chapter)
         db.session.commit()
 
-        invalidate_cache(f"chapters:subject:{subject_id}*")
+        bump_collections("chapters")
 
         return {
             "message": "Chapter created successfully",
@@ -390,13 +450,24 @@ class ChapterResources(Resource):
         if not chapter:
             return {"message": "Chapter not found"}, 404
 
+        renamed = bool(chapter_name) and chapter_name != chapter.name
         if chapter_name:
             chapter.name = chapter_name
         if chapter_description:
             chapter.description = chapter_description
 
+        # Their cached payloads show the chapter name
+        quiz_ids = (
+            [quiz_id for (quiz_id,) in chapter.quizzes.with_entities(Quiz.id)]
+            if renamed
+            else []
+        )
+
         db.session.commit()
 
+        bump_collections("chapters")
+        invalidate_quiz_payloads(quiz_ids)
+
         return {"message": "Chapter updated successfully"}, 200
 
     @jwt_auth_required
@@ -408,56 +479,142 @@ class ChapterResources(Resource):
         if not chapter:
             return {"message": "Chapter not found"}, 404
 
+        # Their cached payloads show the chapter name
+        quiz_ids = [quiz_id for (quiz_id,) in chapter.quizzes.with_entities(Quiz.id)]
+
         db.session.delete(chapter)
         db.session.commit()
 
+        bump_collections("chapters", "quizzes")
+        invalidate_quiz_payloads(quiz_ids)
+        # Deleting the chapter cleared their chapter_id, which the timeline shows
+        for quiz in Quiz.query.filter(Quiz.id.in_(quiz_ids)):
+            refresh_timeline_quiz(quiz)
+
         return {"message": "Chapter deleted successfully"}, 200
 
 
 class QuizResources(Resource):
+    MAX_PAGE_SIZE = 500
+
     @jwt_auth_required
     @role_required(["admin"])
-    # @cache_result()
+    @conditional_get("quizzes", "subjects", "chapters", "questions")
     def get(self):
         """
-        Return quizzes based on subject_id. If subject_id is 9999, return all quizzes.
+        Return quizzes based on subject_id. If subject_id is 99999, return all quizzes.
+        Optional filters: chapter_id, date_from and date_to (YYYY-MM-DD, on the
+        quiz date). Pass limit, and after_id from the previous page's
+        next_cursor, to page through the listing in quiz id order.
         """
         subject_id = request.args.get("subject_id", type=int)
+        chapter_id = request.args.get("chapter_id", type=int)
+        after_id = request.args.get("after_id", type=int)
+        limit = request.args.get("limit", type=int)
 
-        cache_key = f"quizzes:subject:{subject_id if subject_id else 'all'}"
-        cached_data = CacheManager.get_cached_data(cache_key)
-        if cached_data:
-            return cached_data, 200
+        try:
+            date_from, date_to = (
+                datetime.strptime(value, "%Y-%m-%d").date() if value else None
+                for value in (
+                    request.args.get("date_from"),
+                    request.args.get("date_to"),
+                )
+            )
+        except ValueError:
+            return {"message": "Invalid date format. Use YYYY-MM-DD."}, 400
 
-        if subject_id is None or subject_id == 99999:
-            quizzes = Quiz.query.all()
-        else:
-            quizzes = Quiz.query.filter_by(subject_id=subject_id).all()
+        if limit is not None and not 1 <= limit <= self.MAX_PAGE_SIZE:
+            return {"message": f"limit must be between 1 and {self.MAX_PAGE_SIZE}"}, 400
+
+        cache_key = (
+            f"quizzes:subject:{subject_id if subject_id else 'all'}"
+            f":chapter:{chapter_id}:from:{date_from}:to:{date_to}"
+            f":after:{after_id}:limit:{limit}"
+        )
+        tags = ["quizzes", "subjects", "chapters", "questions"]
+        if subject_id:
+            tags.append(f"subject:{subject_id}")
+        result = get_or_compute(
+            cache_key,
+            lambda: self._load_quizzes(
+                subject_id, chapter_id, date_from, date_to, after_id, limit
+            ),
+            180,
+            tags=tags,
+        )
 
-        quizzes_data = []
+        return result, 200
 
-        for quiz in quizzes:
-            subject = Subject.query.get(quiz.subject_id)
-            chapter = Chapter.query.get(quiz.chapter_id)
+    @staticmethod
+    def _load_quizzes(subject_id, chapter_id, date_from, date_to, after_id, limit):
+        # Correlated per row, so only the quizzes on the page are counted.
+        question_count = (
+            select(func.count(Question.id))
+            .where(Question.quiz_id == Quiz.id)
+            .scalar_subquery()
+        )
 
-            quizzes_data.append(
-                {
-                    "quiz_id": quiz.id,
-                    "quiz_title": quiz.quiz_title,
-                    "subject_id": subject.id if subject else None,
-                    "subject_name": subject.name if subject else None,
-                    "chapter_id": chapter.id if chapter else None,
-                    "chapter_name": chapter.name if chapter else None,
-                    "number_of_questions": Question.query.filter_by(
-                        quiz_id=quiz.id
-                    ).count(),
-                }
+        query = (
+            db.session.query(
+                Quiz.id,
+                Quiz.quiz_title,
+                Subject.id,
+                Subject.name,
+                Chapter.id,
+                Chapter.name,
+                question_count,
             )
+            .outerjoin(Subject, Subject.id == Quiz.subject_id)
+            .outerjoin(Chapter, Chapter.id == Quiz.chapter_id)
+        )
+
+        if subject_id is not None and subject_id != 99999:
+            query = query.filter(Quiz.subject_id == subject_id)
+        if chapter_id is not None:
+            query = query.filter(Quiz.chapter_id == chapter_id)
+        if date_from:
+            query = query.filter(Quiz.date_of_quiz >= date_from)
+        if date_to:
+            query = query.filter(Quiz.date_of_quiz <= date_to)
+        if after_id is not None:
+            query = query.filter(Quiz.id > after_id)
+
+        query = query.order_by(Quiz.id)
+        if limit is not None:
+            # One extra row tells us whether another page exists.
+            query = query.limit(limit + 1)
+
+        rows = query.all()
+        has_more = limit is not None and len(rows) > limit
+        if has_more:
+            rows = rows[:limit]
+
+        quizzes_data = [
+            {
+                "quiz_id": quiz_id,
+                "quiz_title": quiz_title,
+                "subject_id": subject_pk,
+                "subject_name": subject_name,
+                "chapter_id": chapter_pk,
+                "chapter_name": chapter_name,
+                "number_of_questions": question_count,
+            }
+            for (
+                quiz_id,
+                quiz_title,
+                subject_pk,
+                subject_name,
+                chapter_pk,
+                chapter_name,
+                question_count,
+            ) in rows
+        ]
 
         result = {"quizzes": quizzes_data}
-        CacheManager.set_cached_data(cache_key, result, 180)
+        if limit is not None:
+            result["next_cursor"] = rows[-1][0] if has_more else None
 
-        return result, 200
+        return result
 
     @jwt_auth_required
     @role_required(["admin"])
@@ -516,6 +673,11 @@ class QuizResources(Resource):
         db.session.add(new_quiz)
         db.session.commit()
 
+        bump_collections("quizzes")
+        refresh_timeline_quiz(new_quiz)
+        schedule_quiz_finalization(new_quiz)
+        schedule_quiz_warmup(new_quiz)
+
         return {"message": "Quiz created successfully", "quiz_id": new_quiz.id}, 201
 
     @jwt_auth_required
@@ -541,6 +703,12 @@ class QuizResources(Resource):
         db.session.delete(quiz)
         db.session.commit()
 
+        bump_collections("quizzes", "questions")
+        cancel_quiz_finalization(quiz_id)
+        cancel_quiz_warmup(quiz_id)
+        invalidate_quiz_payload(quiz_id)
+        remove_timeline_quiz(quiz_id)
+
         return {"message": "Quiz deleted successfully"}, 200
 
     @jwt_auth_required
@@ -592,12 +760,20 @@ class QuizResources(Resource):
 
         db.session.commit()
 
+        bump_collections("quizzes")
+        invalidate_quiz_payload(quiz.id)
+        refresh_timeline_quiz(quiz)
+        if time_duration or time_of_day_str or date:
+            schedule_quiz_finalization(quiz)
+            schedule_quiz_warmup(quiz)
+
         return {"message": "Quiz updated successfully"}, 200
 
 
 class QuestionResources(Resource):
     @jwt_auth_required
     @role_required(["admin"])
+    @conditional_get("questions")
     def get(self):
         quiz_id = request.args.get("quiz_id", type=int)
         if not quiz_id:
@@ -663,6 +839,9 @@ class QuestionResources(Resource):
         db.session.add(new_question)
         db.session.commit()
 
+        bump_collections("questions")
+        invalidate_quiz_payload(quiz_id)
+
         return {
             "message": "Question added successfully",
             "question_id": new_question.id,
@@ -681,9 +860,13 @@ class QuestionResources(Resource):
         if not question:
             return {"message": "Question not found"}, 404
 
+        quiz_id = question.quiz_id
         db.session.delete(question)
         db.session.commit()
 
+        bump_collections("questions")
+        invalidate_quiz_payload(quiz_id)
+
         return {"message": "Question deleted successfully"}, 200
 
     @jwt_auth_required
@@ -720,6 +903,9 @@ class QuestionResources(Resource):
 
         db.session.commit()
 
+        bump_collections("questions")
+        invalidate_quiz_payload(question.quiz_id)
+
         return {"message": "Question updated successfully"}, 200
 
 
@@ -729,139 +915,121 @@ class UserDashboardResource(Resource):
     def get(self):
         """
         Return quizzes categorized into two parts: upcoming quizzes and past quizzes.
+        The quiz lists are shared by all users; attempted_quiz_ids lists the
+        quizzes the caller already has a score for.
         """
         user_id = get_jwt_identity()
 
-        cached_dashboard = CacheManager.get_user_quizzes(user_id)
-        if cached_dashboard:
-            return cached_dashboard, 200
+        upcoming, past = timeline_split(datetime.now())
+        attempted = [
+            quiz_id
+            for (quiz_id,) in db.session.query(Score.quiz_id).filter(
+                Score.user_id == user_id
+            )
+        ]
 
-        current_datetime = datetime.now()
+        # The timeline members are already JSON, so the body is assembled
+        # around them instead of decoding and re-encoding every quiz.
+        body = (
+            '{"upcoming_quizzes":['
+            + ",".join(upcoming)
+            + '],"past_quizzes":['
+            + ",".join(past)
+            + '],"attempted_quiz_ids":'
+            + json.dumps(attempted)
+            + "}"
+        )
+        return Response(body, status=200, mimetype="application/json")
 
-        quizzes = Quiz.query.order_by(Quiz.date_of_quiz.asc()).all()
-        upcoming_quizzes = []
-        past_quizzes = []
 
-        for quiz in quizzes:
-            quiz_start_datetime = (
-                datetime.combine(quiz.date_of_quiz, quiz.time_of_day)
-                if quiz.time_of_day
-                else datetime.combine(quiz.date_of_quiz, datetime.min.time())
-            )
-            quiz_end_datetime = quiz_start_datetime + timedelta(
-                minutes=quiz.time_duration
-            )
-            quiz_data = {
-                "id": quiz.id,
-                "title": quiz.quiz_title,
-                "date_of_quiz": quiz.date_of_quiz.isoformat(),
-                "duration": quiz.time_duration,
-                "chapter": quiz.chapter_id,
-                "subject": quiz.subject_id,
-                "time_of_day": (
-                    quiz.time_of_day.isoformat() if quiz.time_of_day else None
-                ),
-            }
-            if quiz_end_datetime > current_datetime:
-                upcoming_quizzes.append(quiz_data)
-            else:
-                past_quizzes.append(quiz_data)
+SCORE_HISTORY_MAX_PAGE_SIZE = 200
 
-        result = {
-            "upcoming_quizzes": upcoming_quizzes,
-            "past_quizzes": past_quizzes,
-        }
 
-        CacheManager.set_user_quizzes(user_id, result, 180)
+def score_history_args():
+    """Read the score history filters shared by the score endpoints.
 
-        return result, 200
+    Accepts subject_id, date_from and date_to (YYYY-MM-DD), limit and the
+    cursor returned as next_cursor by the previous page. Raises ValueError
+    with a client-facing message on bad input.
+    """
+    limit = request.args.get("limit", type=int)
+    if limit is not None and not 1 <= limit <= SCORE_HISTORY_MAX_PAGE_SIZE:
+        raise ValueError(f"limit must be between 1 and {SCORE_HISTORY_MAX_PAGE_SIZE}")
+
+    try:
+        date_from, date_to = (
+            datetime.strptime(value, "%Y-%m-%d") if value else None
+            for value in (request.args.get("date_from"), request.args.get("date_to"))
+        )
+    except ValueError:
+        raise ValueError("Invalid date format. Use YYYY-MM-DD.")
+
+    cursor = request.args.get("cursor")
+    if cursor:
+        try:
+            decode_cursor(cursor)
+        except ValueError:
+            raise ValueError("Invalid cursor")
+
+    return {
+        "subject_id": request.args.get("subject_id", type=int),
+        "date_from": date_from,
+        "date_to": date_to,
+        "cursor": cursor,
+        "limit": limit,
+    }
 
 
 class ScoresResource(Resource):
     @jwt_auth_required
     @role_required(["user"])
-    @cache_result()
+    @cache_response(300, tags=(SCORE_HISTORY_TAG,))
     def get(self):
-        """return all the scores of the user"""
+        """return the scores of the user, newest first.
+        Accepts the score history filters and paging parameters."""
         user_id = get_jwt_identity()
 
-        scores = Score.query.filter_by(user_id=user_id).all()
-        scores_data = []
-        for score in scores:
-            quiz = Quiz.query.get(score.quiz_id)
-            subject = Subject.query.get(quiz.subject_id) if quiz else None
-            chapter = Chapter.query.get(quiz.chapter_id) if quiz else None
-
-            scores_data.append(
-                {
-                    "id": score.id,
-                    "quiz_id": score.quiz_id,
-                    "quiz_title": quiz.quiz_title if quiz else None,
-                    "subject_name": subject.name if subject else None,
-                    "chapter_name": chapter.name if chapter else None,
-                    "score": score.score,
-                    "timestamp": score.timestamp.isoformat(),
-                }
-            )
-        return {"data": scores_data}, 200
+        try:
+            filters = score_history_args()
+            scores_data, next_cursor = score_history(int(user_id), **filters)
+        except ValueError as e:
+            return {"message": str(e)}, 400
+
+        result = {"data": scores_data}
+        if filters["limit"] is not None:
+            result["next_cursor"] = next_cursor
+        return result, 200
 
 
 class TakeQuizResource(Resource):
     def get(self):
         """return the quiz_id, number of questions, time duration, and time of day for the quiz, question_id, question, options, marks
         Expects a query parameter `quiz_id`.
-        Keyword arguments:
-        argument -- description
-        Return: return_description
+        The payload is served pre-encoded from cache with a strong ETag, and
+        a matching If-None-Match gets an empty 304.
         """
 
-        quiz_id = request.args.get("quiz_id")
+        quiz_id = request.args.get("quiz_id", type=int)
         if not quiz_id:
             return {"message": "quiz_id is required"}, 400
 
-        quiz = Quiz.query.get(quiz_id)
-        if not quiz:
+        body, etag = get_quiz_payload(quiz_id)
+        if body is None:
             return {"message": "Quiz not found"}, 404
 
-        subject = Subject.query.get(quiz.subject_id)
-        chapter = Chapter.query.get(quiz.chapter_id)
-
-        questions = Question.query.filter_by(quiz_id=quiz_id).all()
-        questions_data = []
-        for question in questions:
-            questions_data.append(
-                {
-                    "id": question.id,
-                    "question": question.question,
-                    "options": [
-                        question.option1,
-                        question.option2,
-                        question.option3,
-                        question.option4,
-                    ],
-                    "marks": question.marks,
-                }
-            )
-
-        return {
-            "data": {
-                "quiz_id": quiz.id,
-                "quiz_title": quiz.quiz_title,
-                "number_of_questions": len(questions),
-                "time_duration": quiz.time_duration,
-                "time_of_day": (
-                    quiz.time_of_day.isoformat() if quiz.time_of_day else None
-                ),
-                "subject_name": subject.name if subject else None,
-                "chapter_name": chapter.name if chapter else None,
-                "questions": questions_data,
-            }
-        }, 200
+        if request.if_none_match.contains(etag):
+            response = Response(status=304)
+        else:
+            response = Response(body, status=200, mimetype="application/json")
+        response.set_etag(etag)
+        response.headers["Cache-Control"] = "no-cache"
+        return response
 
 
 class TakeResponseResource(Resource):
     @jwt_auth_required
     @role_required(["user"])
+    @rate_limit()
     def post(self):
         """
         Submit the quiz responses and calculate the score.
@@ -878,36 +1046,39 @@ class TakeResponseResource(Resource):
             question_id = args["question_id"]
             selected_option = args["selected_option"]
 
-            quiz = Quiz.query.get(quiz_id)
-            if not quiz:
-                return {"message": "Quiz not found"}, 404
-
-            question = Question.query.get(question_id)
+            question = (
+                db.session.query(Question.answer, Quiz.starts_at, Quiz.ends_at)
+                .join(Quiz, Quiz.id == Question.quiz_id)
+                .filter(Question.id == question_id, Question.quiz_id == quiz_id)
+                .first()
+            )
             if not question:
-                return {"message": "Question not found"}, 404
+                return {"message": "Question not found for this quiz"}, 404
 
-            existing_response = QuizResponse.query.filter_by(
-                quiz_id=quiz_id, user_id=user_id, question_id=question_id
-            ).first()
-
-            if existing_response:
+            now = datetime.now()
+            rows = [
+                {
+                    "quiz_id": quiz_id,
+                    "user_id": int(user_id),
+                    "question_id": question_id,
+                    "selected_option": selected_option,
+                    "is_correct": question.answer == selected_option,
+                    "timestamp": now,
+                }
+            ]
 
-                existing_response.selected_option = selected_option
-                existing_response.is_correct = question.answer == selected_option
-                existing_response.timestamp = datetime.now()
-                response_id = existing_response.id
-            else:
+            if should_buffer(question.starts_at, question.ends_at, now) and (
+                buffer_answers(quiz_id, int(user_id), rows)
+            ):
+                return {
+                    "message": "Response recorded successfully",
+                    "quiz_response_id": None,
+                    "buffered": True,
+                    "status": "success",
+                }, 201
 
-                quiz_response = QuizResponse(
-                    quiz_id=quiz_id,
-                    user_id=user_id,
-                    question_id=question_id,
-                    selected_option=selected_option,
-                    is_correct=(question.answer == selected_option),
-                    timestamp=datetime.now(),
-                )
-                db.session.add(quiz_response)
-                response_id = quiz_response.id
+            response_ids = upsert_answers(rows)
+            response_id = response_ids.get(question_id)
 
             db.session.commit()
 
@@ -923,6 +1094,124 @@ class TakeResponseResource(Resource):
             return {"message": "Error recording response", "error": str(e)}, 500
 
 
+class TakeResponsesBatchResource(Resource):
+    MAX_ANSWERS = 500
+
+    @jwt_auth_required
+    @role_required(["user"])
+    @rate_limit()
+    def post(self):
+        """
+        Submit several answers for one quiz in a single request.
+        Expects a JSON body with quiz_id and answers, a list of
+        {question_id, selected_option} objects. Returns a result per answer.
+        """
+        user_id = get_jwt_identity()
+        if not user_id:
+            return {"message": "Authentication required"}, 401
+
+        args = take_responses_batch_parser.parse_args()
+        quiz_id = args["quiz_id"]
+        answers = args["answers"]
+
+        if not answers:
+            return {"message": "At least one answer is required"}, 400
+        if len(answers) > self.MAX_ANSWERS:
+            return {
+                "message": f"At most {self.MAX_ANSWERS} answers can be submitted at once"
+            }, 400
+
+        try:
+            quiz = (
+                db.session.query(Quiz.starts_at, Quiz.ends_at)
+                .filter(Quiz.id == quiz_id)
+                .first()
+            )
+            if not quiz:
+                return {"message": "Quiz not found"}, 404
+
+            correct_answers = dict(
+                db.session.query(Question.id, Question.answer).filter(
+                    Question.quiz_id == quiz_id
+                )
+            )
+
+            now = datetime.now()
+            results = []
+            rows = {}
+
+            for answer in answers:
+                question_id = (
+                    answer.get("question_id") if isinstance(answer, dict) else None
+                )
+                selected_option = (
+                    answer.get("selected_option") if isinstance(answer, dict) else None
+                )
+
+                if not isinstance(question_id, int) or selected_option is None:
+                    results.append(
+                        {
+                            "question_id": question_id,
+                            "status": "error",
+                            "message": "question_id and selected_option are required",
+                        }
+                    )
+                    continue
+
+                if question_id not in correct_answers:
+                    results.append(
+                        {
+                            "question_id": question_id,
+                            "status": "error",
+                            "message": "Question not found for this quiz",
+                        }
+                    )
+                    continue
+
+                # A later answer for the same question replaces an earlier one.
+                rows[question_id] = {
+                    "quiz_id": quiz_id,
+                    "user_id": int(user_id),
+                    "question_id": question_id,
+                    "selected_option": str(selected_option),
+                    "is_correct": correct_answers[question_id] == str(selected_option),
+                    "timestamp": now,
+                }
+                results.append({"question_id": question_id, "status": "recorded"})
+
+            buffered = (
+                bool(rows)
+                and should_buffer(quiz.starts_at, quiz.ends_at, now)
+                and buffer_answers(quiz_id, int(user_id), list(rows.values()))
+            )
+            if buffered:
+                response_ids = {}
+            else:
+                response_ids = upsert_answers(list(rows.values()))
+                db.session.commit()
+
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error recording responses: {str(e)}")
+            return {"message": "Error recording responses", "error": str(e)}, 500
+
+        for result in results:
+            if result["status"] == "recorded":
+                result["quiz_response_id"] = response_ids.get(result["question_id"])
+
+        recorded = sum(1 for result in results if result["status"] == "recorded")
+
+        return {
+            "message": f"Recorded {recorded} of {len(results)} responses",
+            "quiz_id": quiz_id,
+            "recorded": recorded,
+            "failed": len(results) - recorded,
+            "buffered": buffered,
+            "results": results,
+            "status": "success" if recorded == len(results) else "partial",
+        }, (201 if recorded else 400)
+
+
 class ReturnUsersScoreBoard(Resource):
     @jwt_auth_required
     @role_required(["user"])
@@ -934,29 +1223,85 @@ class ReturnUsersScoreBoard(Resource):
         if not user_id:
             return {"message": "Authentication required"}, 401
 
-        scores = Score.query.filter_by(user_id=user_id).all()
-        if not scores:
+        try:
+            filters = score_history_args()
+            scores_data, next_cursor = score_history(int(user_id), **filters)
+        except ValueError as e:
+            return {"message": str(e)}, 400
+
+        if not scores_data and not any(filters.values()):
             return {"message": "No scores found for this user"}, 404
 
-        scores_data = []
-        for score in scores:
-            quiz = Quiz.query.get(score.quiz_id)
-            subject = Subject.query.get(quiz.subject_id) if quiz else None
-            chapter = Chapter.query.get(quiz.chapter_id) if quiz else None
+        result = {"scores": scores_data}
+        if filters["limit"] is not None:
+            result["next_cursor"] = next_cursor
+        return result, 200
+
+
+class LeaderboardResource(Resource):
+    MAX_LIMIT = 100
+
+    @jwt_auth_required
+    @role_required(["user", "admin"])
+    def get(self):
+        """
+        Return the top entries of a leaderboard and the caller's own rank.
+        Query parameters: scope (quiz, subject or global, default global),
+        id (the quiz or subject id) and limit (default 10).
+        Quiz boards rank by score, subject and global boards by total points.
+        """
+        user_id = get_jwt_identity()
+        scope = request.args.get("scope", "global")
+        scope_id = request.args.get("id", type=int)
+        limit = request.args.get("limit", 10, type=int)
+
+        if scope not in LEADERBOARD_SCOPES:
+            return {"message": "scope must be quiz, subject or global"}, 400
+        if scope != "global" and scope_id is None:
+            return {"message": f"id is required for the {scope} leaderboard"}, 400
+        if scope == "global":
+            scope_id = None
+        if not 1 <= limit <= self.MAX_LIMIT:
+            return {"message": f"limit must be between 1 and {self.MAX_LIMIT}"}, 400
+
+        try:
+            top = leaderboard_top(scope, scope_id, limit)
+            rank, value, size = leaderboard_ranks([(scope, scope_id)], int(user_id))[
+                (scope, scope_id)
+            ]
+        except Exception as e:
+            logging.error(f"Error reading leaderboard: {str(e)}")
+            return {"message": "Leaderboard unavailable", "error": str(e)}, 503
+
+        users = {
+            user.id: user
+            for user in User.query.filter(User.id.in_([entry[1] for entry in top]))
+        }
 
-            scores_data.append(
+        return {
+            "scope": scope,
+            "id": scope_id,
+            "total_entries": size,
+            "top": [
                 {
-                    "id": score.id,
-                    "quiz_id": score.quiz_id,
-                    "quiz_title": quiz.quiz_title if quiz else None,
-                    "subject_name": subject.name if subject else None,
-                    "chapter_name": chapter.name if chapter else None,
-                    "score": score.score,
-                    "timestamp": score.timestamp.isoformat(),
+                    "rank": entry_rank,
+                    "user_id": entry_user_id,
+                    "username": (
+                        users[entry_user_id].username
+                        if entry_user_id in users
+                        else None
+                    ),
+                    "full_name": (
+                        users[entry_user_id].full_name
+                        if entry_user_id in users
+                        else None
+                    ),
+                    "value": entry_value,
                 }
-            )
-
-        return {"scores": scores_data}, 200
+                for entry_rank, entry_user_id, entry_value in top
+            ],
+            "me": ({"rank": rank, "value": value} if rank is not None else None),
+        }, 200
 
 
 class MyQuizStats(Resource):
@@ -970,9 +1315,9 @@ class MyQuizStats(Resource):
         if not user_id:
             return {"message": "Authentication required"}, 401
 
-        scores = Score.query.filter_by(user_id=user_id).all()
+        stats = db.session.get(UserStats, int(user_id))
 
-        total_quizzes_taken = len(scores)
+        total_quizzes_taken = stats.quizzes_taken if stats else 0
         if total_quizzes_taken == 0:
             return {
                 "message": "No quiz activity found",
@@ -987,18 +1332,13 @@ class MyQuizStats(Resource):
                 },
             }, 200
 
-        total_points = sum(score.score for score in scores)
-        average_score = round(total_points / total_quizzes_taken, 2)
-        best_score = max(score.score for score in scores)
-        worst_score = min(score.score for score in scores)
+        total_points = stats.total_points
+        average_score = round(stats.average_score, 2)
+        best_score = stats.best_score
+        worst_score = stats.worst_score
 
-        total_correct_answers = QuizResponse.query.filter_by(
-            user_id=user_id, is_correct=True
-        ).count()
-
-        total_questions_attempted = QuizResponse.query.filter_by(
-            user_id=user_id
-        ).count()
+        total_correct_answers = stats.correct_answers
+        total_questions_attempted = stats.questions_answered
 
         accuracy_percentage = round(
             (
@@ -1009,65 +1349,39 @@ class MyQuizStats(Resource):
             2,
         )
 
-        subject_stats = {}
-        quiz_ids = [score.quiz_id for score in scores]
-        quizzes = Quiz.query.filter(Quiz.id.in_(quiz_ids)).all()
-
-        for quiz in quizzes:
-            subject = Subject.query.get(quiz.subject_id)
-            if subject:
-                subject_name = subject.name
-                user_scores_for_subject = [
-                    s.score for s in scores if s.quiz_id == quiz.id
-                ]
-
-                if subject_name not in subject_stats:
-                    subject_stats[subject_name] = {
-                        "subject_id": subject.id,
-                        "quizzes_taken": 0,
-                        "total_score": 0,
-                        "best_score": 0,
-                        "worst_score": 100,
-                    }
-
-                for score_val in user_scores_for_subject:
-                    subject_stats[subject_name]["quizzes_taken"] += 1
-                    subject_stats[subject_name]["total_score"] += score_val
-                    subject_stats[subject_name]["best_score"] = max(
-                        subject_stats[subject_name]["best_score"], score_val
-                    )
-                    subject_stats[subject_name]["worst_score"] = min(
-                        subject_stats[subject_name]["worst_score"], score_val
-                    )
+        subject_rows = (
+            db.session.query(UserSubjectStats, Subject.name)
+            .join(Subject, Subject.id == UserSubjectStats.subject_id)
+            .filter(UserSubjectStats.user_id == stats.user_id)
+            .all()
+        )
 
-        subject_breakdown = []
-        for subject_name, stats in subject_stats.items():
-            avg_score = round(stats["total_score"] / stats["quizzes_taken"], 2)
-            subject_breakdown.append(
-                {
-                    "subject_name": subject_name,
-                    "subject_id": stats["subject_id"],
-                    "quizzes_taken": stats["quizzes_taken"],
-                    "average_score": avg_score,
-                    "best_score": stats["best_score"],
-                    "worst_score": (
-                        stats["worst_score"]
-                        if stats["worst_score"] != 100
-                        else stats["best_score"]
-                    ),
-                }
-            )
+        subject_breakdown = [
+            {
+                "subject_name": subject_name,
+                "subject_id": subject_stats.subject_id,
+                "quizzes_taken": subject_stats.quizzes_taken,
+                "average_score": round(subject_stats.average_score, 2),
+                "best_score": subject_stats.best_score,
+                "worst_score": subject_stats.worst_score,
+            }
+            for subject_stats, subject_name in subject_rows
+        ]
 
         subject_breakdown.sort(key=lambda x: x["quizzes_taken"], reverse=True)
 
-        recent_scores = sorted(scores, key=lambda x: x.timestamp, reverse=True)
+        recent_scores = [
+            score
+            for (score,) in db.session.query(Score.score)
+            .filter(Score.user_id == stats.user_id)
+            .order_by(Score.timestamp.desc())
+            .limit(10)
+        ]
         performance_trend = "stable"
 
         if len(recent_scores) >= 6:
-            recent_5_avg = sum(s.score for s in recent_scores[:5]) / 5
-            previous_5_avg = sum(s.score for s in recent_scores[5:10]) / min(
-                5, len(recent_scores[5:])
-            )
+            recent_5_avg = sum(recent_scores[:5]) / 5
+            previous_5_avg = sum(recent_scores[5:10]) / min(5, len(recent_scores[5:]))
 
             if recent_5_avg > previous_5_avg + 5:
                 performance_trend = "improving"
@@ -1076,13 +1390,12 @@ class MyQuizStats(Resource):
 
         achievements = []
 
-        perfect_scores = [s for s in scores if s.score == 100]
-        if perfect_scores:
+        if stats.perfect_scores:
             achievements.append(
                 {
                     "type": "perfect_score",
                     "title": "Perfect Score!",
-                    "description": f"Achieved perfect score {len(perfect_scores)} time(s)",
+                    "description": f"Achieved perfect score {stats.perfect_scores} time(s)",
                     "icon": "🏆",
                 }
             )
@@ -1108,8 +1421,7 @@ class MyQuizStats(Resource):
             )
 
         if len(recent_scores) >= 5:
-            recent_5_scores = [s.score for s in recent_scores[:5]]
-            if all(score >= 70 for score in recent_5_scores):
+            if all(score >= 70 for score in recent_scores[:5]):
                 achievements.append(
                     {
                         "type": "consistent",
@@ -1130,30 +1442,12 @@ class MyQuizStats(Resource):
                     }
                 )
 
-        all_users_avg_scores = []
-        all_users = User.query.filter_by(role="user").all()
-        for user in all_users:
-            user_scores = Score.query.filter_by(user_id=user.id).all()
-            if user_scores:
-                user_avg = sum(s.score for s in user_scores) / len(user_scores)
-                all_users_avg_scores.append(user_avg)
-
-        if all_users_avg_scores:
-            better_than_count = sum(
-                1 for avg in all_users_avg_scores if average_score > avg
-            )
-            percentile_rank = round(
-                (better_than_count / len(all_users_avg_scores)) * 100, 1
-            )
-        else:
-            percentile_rank = 0
+        percentile_rank = user_average_percentile(stats.average_score)
 
         thirty_days_ago = datetime.now() - timedelta(days=30)
-        recent_activity = (
-            Score.query.filter_by(user_id=user_id)
-            .filter(Score.timestamp >= thirty_days_ago)
-            .count()
-        )
+        recent_activity = Score.query.filter(
+            Score.user_id == stats.user_id, Score.timestamp >= thirty_days_ago
+        ).count()
 
         return {
             "stats": {
@@ -1202,206 +1496,13 @@ class AdminDashboardStatsResource(Resource):
     def get(self):
         """
         Return comprehensive admin dashboard statistics including users, quizzes, performance metrics, and trends.
+        Served from the snapshot refreshed by Celery beat; generated_at tells when
+        it was computed and ?fresh=1 recomputes it now.
         """
-        try:
-            # Basic counts
-            total_users = User.query.filter_by(role="user").count()
-            total_admins = User.query.filter_by(role="admin").count()
-            total_quizzes = Quiz.query.count()
-            total_questions = Question.query.count()
-            total_attempts = Score.query.count()
-            total_subjects = Subject.query.count()
-            total_chapters = Chapter.query.count()
-
-            # Time-based statistics
-            thirty_days_ago = datetime.now() - timedelta(days=30)
-            seven_days_ago = datetime.now() - timedelta(days=7)
-
-            new_users_30d = User.query.filter(
-                User.date_of_birth >= thirty_days_ago, User.role == "user"
-            ).count()
-
-            recent_quizzes_7d = Quiz.query.filter(
-                Quiz.date_of_quiz >= seven_days_ago.date()
-            ).count()
-
-            recent_attempts_7d = Score.query.filter(
-                Score.timestamp >= seven_days_ago
-            ).count()
-
-            # Performance statistics
-            all_scores = Score.query.all()
-            if all_scores:
-                average_score = round(
-                    sum(s.score for s in all_scores) / len(all_scores), 2
-                )
-                highest_score = max(s.score for s in all_scores)
-                lowest_score = min(s.score for s in all_scores)
-            else:
-                average_score = 0
-                highest_score = 0
-                lowest_score = 0
-
-            # Subject performance breakdown
-            subject_stats = []
-            subjects = Subject.query.all()
-            for subject in subjects:
-                subject_quizzes = Quiz.query.filter_by(subject_id=subject.id).count()
-                subject_scores = (
-                    db.session.query(Score)
-                    .join(Quiz)
-                    .filter(Quiz.subject_id == subject.id)
-                    .all()
-                )
-
-                if subject_scores:
-                    subject_avg = round(
-                        sum(s.score for s in subject_scores) / len(subject_scores), 2
-                    )
-                    subject_attempts = len(subject_scores)
-                else:
-                    subject_avg = 0
-                    subject_attempts = 0
-
-                subject_stats.append(
-                    {
-                        "subject_name": subject.name,
-                        "total_quizzes": subject_quizzes,
-                        "total_attempts": subject_attempts,
-                        "average_score": subject_avg,
-                    }
-                )
-
-            # Top performing users
-            user_performance = []
-            users = User.query.filter_by(role="user").all()
-            for user in users:
-                user_scores = Score.query.filter_by(user_id=user.id).all()
-                if user_scores:
-                    user_avg = round(
-                        sum(s.score for s in user_scores) / len(user_scores), 2
-                    )
-                    user_performance.append(
-                        {
-                            "username": user.username,
-                            "full_name": user.full_name,
-                            "total_attempts": len(user_scores),
-                            "average_score": user_avg,
-                        }
-                    )
-
-            # Sort by average score and take top 10
-            top_performers = sorted(
-                user_performance, key=lambda x: x["average_score"], reverse=True
-            )[:10]
-
-            # Quiz engagement statistics
-            quiz_engagement = []
-            quizzes = Quiz.query.all()
-            for quiz in quizzes:
-                quiz_attempts = Score.query.filter_by(quiz_id=quiz.id).count()
-                quiz_scores = Score.query.filter_by(quiz_id=quiz.id).all()
-
-                if quiz_scores:
-                    quiz_avg = round(
-                        sum(s.score for s in quiz_scores) / len(quiz_scores), 2
-                    )
-                else:
-                    quiz_avg = 0
-
-                subject = Subject.query.get(quiz.subject_id)
-                chapter = Chapter.query.get(quiz.chapter_id)
-
-                quiz_engagement.append(
-                    {
-                        "quiz_title": quiz.quiz_title,
-                        "subject_name": subject.name if subject else "Unknown",
-                        "chapter_name": chapter.name if chapter else "Unknown",
-                        "total_attempts": quiz_attempts,
-                        "average_score": quiz_avg,
-                        "date_created": (
-                            quiz.date_of_quiz.isoformat() if quiz.date_of_quiz else None
-                        ),
-                    }
-                )
-
-            # Sort by total attempts
-            popular_quizzes = sorted(
-                quiz_engagement, key=lambda x: x["total_attempts"], reverse=True
-            )[:10]
-
-            # Monthly trends (last 6 months)
-            monthly_trends = []
-            for i in range(6):
-                month_start = datetime.now().replace(day=1) - timedelta(days=30 * i)
-                month_end = month_start + timedelta(days=30)
-
-                month_users = User.query.filter(
-                    User.date_of_birth >= month_start,
-                    User.date_of_birth < month_end,
-                    User.role == "user",
-                ).count()
-
-                month_attempts = Score.query.filter(
-                    Score.timestamp >= month_start, Score.timestamp < month_end
-                ).count()
-
-                monthly_trends.append(
-                    {
-                        "month": month_start.strftime("%Y-%m"),
-                        "new_users": month_users,
-                        "quiz_attempts": month_attempts,
-                    }
-                )
-
-            # System health metrics
-            active_users_30d = (
-                db.session.query(Score.user_id)
-                .filter(Score.timestamp >= thirty_days_ago)
-                .distinct()
-                .count()
-            )
+        fresh = request.args.get("fresh", "").lower() in ("1", "true", "yes")
 
-            engagement_rate = (
-                round((active_users_30d / total_users * 100), 2)
-                if total_users > 0
-                else 0
-            )
-
-            avg_questions_per_quiz = (
-                round(total_questions / total_quizzes, 2) if total_quizzes > 0 else 0
-            )
-            avg_attempts_per_user = (
-                round(total_attempts / total_users, 2) if total_users > 0 else 0
-            )
-
-            return {
-                "overview": {
-                    "total_users": total_users,
-                    "total_admins": total_admins,
-                    "total_quizzes": total_quizzes,
-                    "total_questions": total_questions,
-                    "total_attempts": total_attempts,
-                    "total_subjects": total_subjects,
-                    "total_chapters": total_chapters,
-                    "new_users_30d": new_users_30d,
-                    "recent_quizzes_7d": recent_quizzes_7d,
-                    "recent_attempts_7d": recent_attempts_7d,
-                },
-                "performance": {
-                    "average_score": average_score,
-                    "highest_score": highest_score,
-                    "lowest_score": lowest_score,
-                    "engagement_rate": engagement_rate,
-                    "active_users_30d": active_users_30d,
-                    "avg_questions_per_quiz": avg_questions_per_quiz,
-                    "avg_attempts_per_user": avg_attempts_per_user,
-                },
-                "subject_breakdown": subject_stats,
-                "top_performers": top_performers,
-                "popular_quizzes": popular_quizzes,
-                "monthly_trends": list(reversed(monthly_trends)),
-            }, 200
+        try:
+            return get_admin_dashboard_snapshot(fresh=fresh), 200
 
         except Exception as e:
             logging.error(f"Error fetching admin dashboard stats: {str(e)}")
@@ -1,30 +1,63 @@
 import os
+import uuid
 from datetime import datetime, timedelta
 
-from app.cache import CacheManager, cache_result
+from app.cache import CacheManager, cache_stats, get_or_compute, redis_client
 from app.middleware import jwt_auth_required, role_required
-from app.models import Quiz, Score, User, db
+from app.models import Quiz, Score, User, UserStats, db
 from app.tasks import generate_user_stats_csv
+from app.timeseries import GRANULARITIES, activity_series, bucket_start
 from flask import request, send_file
+from flask_jwt_extended import get_jwt_identity
 from flask_restful import Resource
 
 
 class CachedUserStats:
+    KEY = "user_stats:{user_id}"
+    EXPIRATION = 300
+
     @staticmethod
-    @cache_result()
     def get_user_stats(user_id):
         """Get cached statistics for a user"""
+        return CachedUserStats.get_many_user_stats([user_id])[user_id]
 
-        scores = Score.query.filter_by(user_id=user_id).all()
-        quizzes_taken = len(scores)
-        total_points = sum(score.score for score in scores) if scores else 0
-        avg_score = total_points / quizzes_taken if quizzes_taken > 0 else 0
-
-        return {
-            "quizzes_taken": quizzes_taken,
-            "total_points": total_points,
-            "average_score": avg_score,
+    @staticmethod
+    def get_many_user_stats(user_ids):
+        """Get cached statistics for several users.
+
+        Cached rows are read in one round trip; the rest come from one
+        ``UserStats`` query and are written back in one pipeline.
+        """
+        keys = {
+            user_id: CachedUserStats.KEY.format(user_id=user_id) for user_id in user_ids
         }
+        cached = CacheManager.get_many(list(keys.values()))
+        stats = {user_id: cached[key] for user_id, key in keys.items() if key in cached}
+
+        missing = [user_id for user_id in keys if user_id not in stats]
+        if missing:
+            rows = {
+                row.user_id: row
+                for row in UserStats.query.filter(UserStats.user_id.in_(missing))
+            }
+            fresh = {
+                user_id: {
+                    "quizzes_taken": row.quizzes_taken if row else 0,
+                    "total_points": row.total_points if row else 0,
+                    "average_score": row.average_score if row else 0,
+                }
+                for user_id, row in (
+                    (user_id, rows.get(user_id)) for user_id in missing
+                )
+            }
+            CacheManager.set_many(
+                {keys[user_id]: data for user_id, data in fresh.items()},
+                CachedUserStats.EXPIRATION,
+                tags={keys[user_id]: (f"user:{user_id}",) for user_id in missing},
+            )
+            stats.update(fresh)
+
+        return stats
 
 
 class AdminDashboardResource(Resource):
@@ -34,11 +67,10 @@ class AdminDashboardResource(Resource):
     def get(self):
         """Get admin dashboard statistics"""
 
-        cache_key = "admin:dashboard:stats"
-        cached_stats = CacheManager.get_cached_data(cache_key)
-        if cached_stats:
-            return cached_stats, 200
+        return get_or_compute("admin:dashboard:stats", self._load_stats, 300), 200
 
+    @staticmethod
+    def _load_stats():
         total_users = User.query.count()
 
         total_quizzes = Quiz.query.count()
@@ -46,7 +78,7 @@ class AdminDashboardResource(Resource):
         total_attempts = Score.query.count()
 
         thirty_days_ago = datetime.now() - timedelta(days=30)
-        new_users = User.query.filter(User.date_of_birth >= thirty_days_ago).count()
+        new_users = User.query.filter(User.created_at >= thirty_days_ago).count()
 
         seven_days_ago = datetime.now() - timedelta(days=7)
         recent_quizzes = Quiz.query.filter(Quiz.date_of_quiz >= seven_days_ago).count()
@@ -54,7 +86,7 @@ class AdminDashboardResource(Resource):
         scores = [score.score for score in Score.query.all()]
         avg_score = sum(scores) / len(scores) if scores else 0
 
-        result = {
+        return {
             "statistics": {
                 "total_users": total_users,
                 "total_quizzes": total_quizzes,
@@ -65,22 +97,45 @@ class AdminDashboardResource(Resource):
             }
         }
 
-        CacheManager.set_cached_data(cache_key, result, 300)
-
-        return result, 200
-
 
 class ExportUserStatsResource(Resource):
+    # Holds the id of the export an admin started last, so repeated clicks
+    # within the TTL return that job instead of starting another.
+    LOCK_KEY = "lock:export:user_stats:{identity}"
+    LOCK_TTL = 60
+
     @jwt_auth_required
     @role_required(["admin"])
-    @cache_result()
     def post(self):
         """Trigger asynchronous CSV generation of user statistics"""
-        task = generate_user_stats_csv.delay()
+        lock_key = self.LOCK_KEY.format(identity=get_jwt_identity())
+        task_id = str(uuid.uuid4())
+
+        try:
+            if not redis_client.set(lock_key, task_id, nx=True, ex=self.LOCK_TTL):
+                running_id = redis_client.get(lock_key)
+                if running_id:
+                    return {
+                        "message": "Export already started. You will receive an email when it's complete.",
+                        "task_id": running_id,
+                    }, 202
+                redis_client.set(lock_key, task_id, ex=self.LOCK_TTL)
+        except Exception as e:
+            print(f"Export lock error: {e}")
+
+        try:
+            generate_user_stats_csv.apply_async(task_id=task_id)
+        except Exception:
+            # Let the next request retry instead of returning a job that never ran
+            try:
+                redis_client.delete(lock_key)
+            except Exception as e:
+                print(f"Export lock release error: {e}")
+            raise
 
         return {
             "message": "Export started. You will receive an email when it's complete.",
-            "task_id": str(task.id),
+            "task_id": task_id,
         }, 202
 
     @jwt_auth_required
@@ -129,32 +184,36 @@ class AdminUsersResource(Resource):
         page = int(request.args.get("page", 1))
         per_page = int(request.args.get("per_page", 10))
 
-        cache_key = f"admin:users:page:{page}:per_page:{per_page}"
-        cached_data = CacheManager.get_cached_data(cache_key)
-        if cached_data:
-            return cached_data, 200
+        return (
+            get_or_compute(
+                f"admin:users:page:{page}:per_page:{per_page}",
+                lambda: self._load_page(page, per_page),
+                180,
+            ),
+            200,
+        )
 
+    @staticmethod
+    def _load_page(page, per_page):
         users_pagination = User.query.paginate(
             page=page, per_page=per_page, error_out=False
         )
         users = users_pagination.items
 
-        users_data = []
-        for user in users:
+        user_stats = CachedUserStats.get_many_user_stats([user.id for user in users])
 
-            user_stats = CachedUserStats.get_user_stats(user.id)
-
-            users_data.append(
-                {
-                    "id": user.id,
-                    "username": user.username,
-                    "full_name": user.full_name,
-                    "role": user.role,
-                    "stats": user_stats,
-                }
-            )
+        users_data = [
+            {
+                "id": user.id,
+                "username": user.username,
+                "full_name": user.full_name,
+                "role": user.role,
+                "stats": user_stats[user.id],
+            }
+            for user in users
+        ]
 
-        result = {
+        return {
             "users": users_data,
             "pagination": {
                 "page": page,
@@ -164,6 +223,62 @@ class AdminUsersResource(Resource):
             },
         }
 
-        CacheManager.set_cached_data(cache_key, result, 180)
 
-        return result, 200
+class AdminActivityResource(Resource):
+    # Buckets returned when no start date is given
+    DEFAULT_PERIODS = {"day": 30, "week": 12, "month": 6}
+
+    @jwt_auth_required
+    @role_required(["admin"])
+    def get(self):
+        """
+        Return activity per day, week or month for the admin charts.
+        Query parameters: granularity (day, week or month, default month),
+        date_from and date_to (YYYY-MM-DD, default the last few periods up
+        to today).
+        """
+        granularity = request.args.get("granularity", "month")
+        if granularity not in GRANULARITIES:
+            return {
+                "message": f"granularity must be one of {', '.join(GRANULARITIES)}"
+            }, 400
+
+        try:
+            date_to = request.args.get("date_to")
+            date_to = (
+                datetime.strptime(date_to, "%Y-%m-%d").date()
+                if date_to
+                else datetime.now().date()
+            )
+            date_from = request.args.get("date_from")
+            if date_from:
+                date_from = datetime.strptime(date_from, "%Y-%m-%d").date()
+            else:
+                date_from = bucket_start(date_to, granularity)
+                for _ in range(self.DEFAULT_PERIODS[granularity] - 1):
+                    date_from = bucket_start(date_from - timedelta(days=1), granularity)
+        except ValueError:
+            return {"message": "Invalid date format. Use YYYY-MM-DD."}, 400
+
+        if date_from > date_to:
+            return {"message": "date_from must not be after date_to"}, 400
+
+        try:
+            series = activity_series(date_from, date_to, granularity)
+        except ValueError as e:
+            return {"message": str(e)}, 400
+
+        return {
+            "granularity": granularity,
+            "date_from": date_from.isoformat(),
+            "date_to": date_to.isoformat(),
+            "series": series,
+        }, 200
+
+
+class AdminCacheStatsResource(Resource):
+    @jwt_auth_required
+    @role_required(["admin"])
+    def get(self):
+        """Return hit ratios of the local and Redis cache tiers of this process"""
+        return cache_stats(), 200
@@ -257,3 +257,20 @@ take_response_parser.add_argument(
     help="Selected option is required",
     location="json",
 )
+
+
+take_responses_batch_parser = reqparse.RequestParser()
+take_responses_batch_parser.add_argument(
+    "quiz_id",
+    type=int,
+    required=True,
+    help="Quiz ID is required",
+    location="json",
+)
+take_responses_batch_parser.add_argument(
+    "answers",
+    type=list,
+    required=True,
+    help="Answers must be a list of question_id and selected_option objects",
+    location="json",
+)
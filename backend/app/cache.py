@@ -1,12 +1,392 @@
+import fnmatch
 import hashlib
 import json
+import math
+import os
 import pickle
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from datetime import datetime, timezone
 from functools import wraps
 
 import redis
+from app.codec import codec_stats, decode_value, encode_value
+from app.config import Config
+from flask import Response, request
+from flask_jwt_extended import get_jwt, get_jwt_identity
 
 redis_client = redis.Redis(host="localhost", port=6379, db=1, decode_responses=True)
 
+# Same database without response decoding, for values stored by the codec
+redis_binary = redis.Redis(host="localhost", port=6379, db=1)
+
+# Invalidated keys or patterns are published here, as {"keys": [...]} or
+# {"pattern": "..."}, so every web and worker process drops them from its
+# local tier.
+INVALIDATION_CHANNEL = "cache:invalidate"
+
+# Set of the cache keys written under a tag. Invalidating the tag deletes
+# exactly those keys, so the cost depends on the tag, not on the keyspace.
+TAG_KEY = "cache:tag:{tag}"
+
+# Write a value and register it under its tags. A tag set lives at least as
+# long as the longest-lived key added to it.
+_SET_TAGGED_SCRIPT = """
+redis.call('SET', KEYS[1], ARGV[2], 'EX', ARGV[1])
+for i = 2, #KEYS do
+    redis.call('SADD', KEYS[i], KEYS[1])
+    if redis.call('TTL', KEYS[i]) < tonumber(ARGV[1]) then
+        redis.call('EXPIRE', KEYS[i], ARGV[1])
+    end
+end
+"""
+
+# Delete every key registered under the given tag sets, then the sets, and
+# return the deleted keys.
+_INVALIDATE_TAGS_SCRIPT = """
+local deleted = {}
+for i = 1, #KEYS do
+    local members = redis.call('SMEMBERS', KEYS[i])
+    for j = 1, #members, 500 do
+        redis.call('DEL', unpack(members, j, math.min(j + 499, #members)))
+    end
+    for _, member in ipairs(members) do
+        deleted[#deleted + 1] = member
+    end
+    redis.call('DEL', KEYS[i])
+end
+return deleted
+"""
+_set_tagged = redis_binary.register_script(_SET_TAGGED_SCRIPT)
+_invalidate_tags = redis_client.register_script(_INVALIDATE_TAGS_SCRIPT)
+
+_MISS = object()
+
+
+class LocalCache:
+    """Per-process LRU of decoded cache values in front of Redis.
+
+    Entries expire after at most ``ttl`` seconds even if an invalidation
+    message is lost. Values are shared between callers and must not be
+    mutated.
+    """
+
+    def __init__(self, max_entries, ttl):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.generation = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return _MISS
+            expires_at, value = entry
+            if expires_at <= time.monotonic():
+                del self._entries[key]
+                return _MISS
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl, generation):
+        """Store ``value`` unless an invalidation ran since ``generation`` was read"""
+        ttl = min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            if generation != self.generation:
+                return
+            self._entries[key] = (time.monotonic() + ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, keys):
+        with self._lock:
+            self.generation += 1
+            for key in keys:
+                self._entries.pop(key, None)
+
+    def invalidate(self, pattern):
+        with self._lock:
+            self.generation += 1
+            for key in [k for k in self._entries if fnmatch.fnmatchcase(k, pattern)]:
+                del self._entries[key]
+
+    def clear(self):
+        with self._lock:
+            self.generation += 1
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+local_cache = LocalCache(Config.LOCAL_CACHE_MAX_ENTRIES, Config.LOCAL_CACHE_TTL)
+
+# Hit and miss counters of this process, per tier. A Redis lookup only
+# happens after a local miss.
+_tier_stats = {"local": {"hits": 0, "misses": 0}, "redis": {"hits": 0, "misses": 0}}
+_stats_lock = threading.Lock()
+
+_listener_pid = None
+_listener_lock = threading.Lock()
+
+
+def _count_lookup(tier, outcome):
+    with _stats_lock:
+        _tier_stats[tier][outcome] += 1
+
+
+def cache_stats():
+    """Hit counts and ratios of each tier in this process"""
+    with _stats_lock:
+        tiers = {tier: dict(counts) for tier, counts in _tier_stats.items()}
+    for counts in tiers.values():
+        lookups = counts["hits"] + counts["misses"]
+        counts["hit_ratio"] = round(counts["hits"] / lookups, 4) if lookups else 0
+    tiers["local"]["entries"] = len(local_cache)
+    return {"pid": os.getpid(), "tiers": tiers, "codec": codec_stats()}
+
+
+def _listen_for_invalidations():
+    while True:
+        try:
+            pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+            pubsub.subscribe(INVALIDATION_CHANNEL)
+            # Messages published while unsubscribed are lost, so start clean.
+            local_cache.clear()
+            for message in pubsub.listen():
+                if message["type"] != "message":
+                    continue
+                invalidation = json.loads(message["data"])
+                if "pattern" in invalidation:
+                    local_cache.invalidate(invalidation["pattern"])
+                else:
+                    local_cache.discard(invalidation["keys"])
+        except Exception as e:
+            print(f"Cache invalidation listener error: {e}")
+            time.sleep(1)
+
+
+def _ensure_listener():
+    """Start the invalidation subscriber once per process, also after a fork"""
+    global _listener_pid
+    if _listener_pid == os.getpid():
+        return
+    with _listener_lock:
+        if _listener_pid == os.getpid():
+            return
+        local_cache.clear()
+        threading.Thread(
+            target=_listen_for_invalidations,
+            name="cache-invalidation-listener",
+            daemon=True,
+        ).start()
+        _listener_pid = os.getpid()
+
+
+def cached_get(key):
+    """Read ``key`` from the local tier, then Redis. Returns None on a miss."""
+    return cached_get_many([key]).get(key)
+
+
+def cached_get_many(keys):
+    """Return ``{key: value}`` for the ``keys`` that are cached.
+
+    Keys missing from the local tier are read from Redis in one pipelined
+    round trip.
+    """
+    _ensure_listener()
+
+    found = {}
+    remote = []
+    for key in dict.fromkeys(keys):
+        value = local_cache.get(key)
+        if value is _MISS:
+            _count_lookup("local", "misses")
+            remote.append(key)
+        else:
+            _count_lookup("local", "hits")
+            found[key] = value
+    if not remote:
+        return found
+
+    generation = local_cache.generation
+    pipe = redis_binary.pipeline(transaction=False)
+    for key in remote:
+        pipe.get(key)
+        pipe.pttl(key)
+    results = pipe.execute()
+
+    for key, cached, ttl_ms in zip(remote, results[::2], results[1::2]):
+        if not cached:
+            _count_lookup("redis", "misses")
+            continue
+        try:
+            value = decode_value(cached)
+        except ValueError as e:
+            print(f"Cache decode error for {key}: {e}")
+            _count_lookup("redis", "misses")
+            continue
+        _count_lookup("redis", "hits")
+        # A key without an expiry reports -1 and is held for the full local TTL.
+        local_cache.set(
+            key, value, ttl_ms / 1000 if ttl_ms > 0 else local_cache.ttl, generation
+        )
+        found[key] = value
+    return found
+
+
+def cached_set(key, value, expiration, tags=()):
+    """Write ``value`` to Redis for ``expiration`` seconds and to the local tier.
+
+    The key is registered under ``tags`` so ``invalidate_tags`` can drop it.
+    """
+    cached_set_many({key: value}, expiration, {key: tags})
+
+
+def cached_set_many(values, expiration, tags=None):
+    """Write ``{key: value}`` in one pipelined round trip.
+
+    ``tags`` optionally maps a key to the tags it is registered under.
+    """
+    tags = tags or {}
+    generation = local_cache.generation
+    pipe = redis_binary.pipeline(transaction=False)
+    for key, value in values.items():
+        _set_tagged(
+            keys=[key, *(TAG_KEY.format(tag=tag) for tag in tags.get(key, ()))],
+            args=[expiration, encode_value(value)],
+            client=pipe,
+        )
+    pipe.execute()
+    for key, value in values.items():
+        local_cache.set(key, value, expiration, generation)
+
+
+def invalidate_tags(*tags):
+    """Delete every cache entry registered under any of ``tags``"""
+    if not tags:
+        return
+    try:
+        keys = _invalidate_tags(keys=[TAG_KEY.format(tag=tag) for tag in tags])
+        local_cache.discard(keys)
+        if keys:
+            redis_client.publish(INVALIDATION_CHANNEL, json.dumps({"keys": keys}))
+    except Exception as e:
+        print(f"Cache tag invalidation error for {tags}: {e}")
+
+
+# Values filled through get_or_compute are stored as {"value", "delta",
+# "expires"}: delta is how long the last computation took and expires is when
+# the value goes stale. The key itself lives STALE_GRACE seconds longer, so
+# the previous value can be served while one process recomputes it.
+STALE_GRACE = 60
+
+# Only the holder of the fill lock recomputes. Others serve the stale value,
+# or without one wait up to FILL_WAIT seconds for the holder to store it.
+FILL_LOCK_KEY = "lock:{key}"
+FILL_LOCK_TTL = 30
+FILL_WAIT = 2.0
+FILL_POLL_INTERVAL = 0.05
+
+# Probabilistic early refresh: a read recomputes before expiry with a chance
+# that grows as expiry nears and with the cost of the computation. Higher
+# values refresh earlier.
+EARLY_REFRESH_BETA = 1.0
+
+_RELEASE_LOCK_SCRIPT = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+_release_lock = redis_client.register_script(_RELEASE_LOCK_SCRIPT)
+
+
+def _read_envelope(key):
+    envelope = cached_get(key)
+    if isinstance(envelope, dict) and {"value", "delta", "expires"} <= set(envelope):
+        return envelope
+    return None
+
+
+def _refresh_due(envelope, beta):
+    """XFetch: true once now - delta * beta * ln(rand) passes the expiry"""
+    jitter = envelope["delta"] * beta * math.log(1.0 - random.random())
+    return time.time() - jitter >= envelope["expires"]
+
+
+def get_or_compute(key, compute, expiration, tags=(), beta=EARLY_REFRESH_BETA):
+    """Return the cached value of ``key``, calling ``compute`` to fill it.
+
+    Concurrent misses recompute once: the process holding the fill lock runs
+    ``compute`` while the others serve the stale value or wait briefly for
+    the new one. Hot keys are refreshed shortly before they expire. A None
+    result is returned but not cached, and an ``expiration`` of 0 disables
+    caching, matching ``cache_result``'s default.
+    """
+    if expiration <= 0:
+        return compute()
+
+    try:
+        envelope = _read_envelope(key)
+        if envelope and envelope["expires"] <= time.time():
+            # A stale copy may come from the local tier while Redis already
+            # holds the value another process refreshed.
+            local_cache.discard([key])
+            envelope = _read_envelope(key)
+        if envelope and not _refresh_due(envelope, beta):
+            return envelope["value"]
+
+        lock_key = FILL_LOCK_KEY.format(key=key)
+        token = uuid.uuid4().hex
+        locked = redis_client.set(lock_key, token, nx=True, ex=FILL_LOCK_TTL)
+    except Exception as e:
+        print(f"Cache fill error for {key}: {e}")
+        return compute()
+
+    if not locked:
+        if envelope:
+            return envelope["value"]
+        deadline = time.monotonic() + FILL_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(FILL_POLL_INTERVAL)
+            try:
+                envelope = _read_envelope(key)
+            except Exception as e:
+                print(f"Cache fill error for {key}: {e}")
+                break
+            if envelope:
+                return envelope["value"]
+        return compute()
+
+    try:
+        started = time.monotonic()
+        value = compute()
+        if value is not None:
+            envelope = {
+                "value": value,
+                "delta": time.monotonic() - started,
+                "expires": time.time() + expiration,
+            }
+            try:
+                cached_set(key, envelope, expiration + STALE_GRACE, tags)
+            except Exception as e:
+                print(f"Cache set error for {key}: {e}")
+        return value
+    finally:
+        try:
+            _release_lock(keys=[lock_key], args=[token])
+        except Exception as e:
+            print(f"Cache fill lock release error for {key}: {e}")
+
 
 def cache_key_generator(*args, **kwargs):
     """Generate cache key from function arguments"""
@@ -14,8 +394,8 @@ def cache_key_generator(*args, **kwargs):
     return hashlib.md5(key_data.encode()).hexdigest()
 
 
-def cache_result(expiration=0):
-    """Decorator to cache function results"""
+def cache_result(expiration=0, tags=()):
+    """Decorator to cache function results, registered under ``tags``"""
 
     def decorator(func):
         @wraps(func)
@@ -23,23 +403,96 @@ def cache_result(expiration=0):
 
             cache_key = f"{func.__name__}:{cache_key_generator(*args, **kwargs)}"
 
-            try:
-                cached_result = redis_client.get(cache_key)
-                if cached_result:
-                    return json.loads(cached_result)
-            except Exception as e:
-                print(f"Cache get error: {e}")
+            return get_or_compute(
+                cache_key, lambda: func(*args, **kwargs), expiration, tags
+            )
+
+        return wrapper
+
+    return decorator
 
-            result = func(*args, **kwargs)
 
+RESPONSE_KEY = "response:{endpoint}:{method}:{fingerprint}"
+
+# Parts of a request that can distinguish cached responses
+RESPONSE_VARY_BY = ("identity", "role", "query", "body")
+
+
+def _response_fingerprint(vary_by, body_fields):
+    parts = {}
+    if "identity" in vary_by:
+        parts["identity"] = get_jwt_identity()
+    if "role" in vary_by:
+        parts["role"] = get_jwt().get("role")
+    if "query" in vary_by:
+        parts["query"] = sorted(request.args.items(multi=True))
+    if "body" in vary_by:
+        body = request.get_json(silent=True)
+        body = body if isinstance(body, dict) else {}
+        parts["body"] = {field: body.get(field) for field in body_fields}
+    return hashlib.md5(
+        json.dumps(parts, sort_keys=True, default=str).encode()
+    ).hexdigest()
+
+
+def cache_response(
+    expiration,
+    vary_by=("identity", "role", "query"),
+    body_fields=(),
+    tags=(),
+    statuses=(200,),
+):
+    """Decorator caching a Resource method's response for ``expiration`` seconds.
+
+    The key is built from the endpoint, the HTTP method and the request parts
+    named in ``vary_by``: the JWT identity and role, the query string and the
+    ``body_fields`` of the JSON body. Only responses with a status in
+    ``statuses`` are stored. ``tags`` may contain ``{identity}``, filled with
+    the caller's JWT identity. Apply it below the auth decorators.
+    """
+    unknown = set(vary_by) - set(RESPONSE_VARY_BY)
+    if unknown:
+        raise ValueError(f"Unknown vary_by parts: {sorted(unknown)}")
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
             try:
-                redis_client.setex(
-                    cache_key, expiration, json.dumps(result, default=str)
+                identity = get_jwt_identity()
+                cache_key = RESPONSE_KEY.format(
+                    endpoint=request.endpoint,
+                    method=request.method,
+                    fingerprint=_response_fingerprint(vary_by, body_fields),
                 )
             except Exception as e:
-                print(f"Cache set error: {e}")
-
-            return result
+                print(f"Response cache key error: {e}")
+                return func(*args, **kwargs)
+
+            uncached = []
+
+            def compute():
+                result = func(*args, **kwargs)
+                if isinstance(result, tuple) and len(result) in (2, 3):
+                    data, status = result[0], result[1]
+                    headers = dict(result[2]) if len(result) == 3 else {}
+                elif isinstance(result, (dict, list)):
+                    data, status, headers = result, 200, {}
+                else:
+                    data, status, headers = None, None, {}
+                if status not in statuses:
+                    uncached.append(result)
+                    return None
+                return {"data": data, "status": status, "headers": headers}
+
+            cached = get_or_compute(
+                cache_key,
+                compute,
+                expiration,
+                [tag.format(identity=identity) for tag in tags],
+            )
+            if cached is None:
+                return uncached[0] if uncached else func(*args, **kwargs)
+            return cached["data"], cached["status"], cached["headers"]
 
         return wrapper
 
@@ -47,15 +500,127 @@ def cache_result(expiration=0):
 
 
 def invalidate_cache(pattern):
-    """Invalidate cache entries matching pattern"""
+    """Invalidate cache entries matching pattern in Redis and in every local tier.
+
+    Walks the keyspace incrementally with SCAN, so it is meant for
+    maintenance; request paths invalidate with ``invalidate_tags``.
+    """
+    local_cache.invalidate(pattern)
     try:
-        keys = redis_client.keys(pattern)
-        if keys:
-            redis_client.delete(*keys)
+        batch = []
+        for key in redis_client.scan_iter(match=pattern, count=500):
+            batch.append(key)
+            if len(batch) >= 500:
+                redis_client.delete(*batch)
+                batch = []
+        if batch:
+            redis_client.delete(*batch)
+        redis_client.publish(INVALIDATION_CHANNEL, json.dumps({"pattern": pattern}))
     except Exception as e:
         print(f"Cache invalidation error: {e}")
 
 
+# Per-collection version counters used for conditional GETs. Each hash holds
+# an integer ``version`` and the unix time of the last change in ``modified``.
+COLLECTION_KEY = "collection:{name}"
+
+
+def _seed_collections(pipe, names):
+    """Start missing counters at the current time in milliseconds, so
+    counters recreated after Redis data loss never repeat an old ETag"""
+    now = time.time()
+    for name in names:
+        key = COLLECTION_KEY.format(name=name)
+        pipe.hsetnx(key, "version", int(now * 1000))
+        pipe.hsetnx(key, "modified", now)
+
+
+def collection_versions(names):
+    """Return ``[(version, modified), ...]`` for each collection in one round trip"""
+    pipe = redis_client.pipeline(transaction=False)
+    _seed_collections(pipe, names)
+    for name in names:
+        pipe.hmget(COLLECTION_KEY.format(name=name), "version", "modified")
+    results = pipe.execute()[2 * len(names) :]
+    return [(version, float(modified)) for version, modified in results]
+
+
+def bump_collections(*names):
+    """Mark collections as changed. Call after the write has been committed."""
+    try:
+        pipe = redis_client.pipeline(transaction=True)
+        _seed_collections(pipe, names)
+        now = time.time()
+        for name in names:
+            key = COLLECTION_KEY.format(name=name)
+            pipe.hincrby(key, "version", 1)
+            pipe.hset(key, "modified", now)
+        pipe.execute()
+    except Exception as e:
+        print(f"Collection version bump error for {names}: {e}")
+
+    # Response caches are tagged with the collections they are built from, so
+    # a fresh ETag is never paired with a stale cached body.
+    invalidate_tags(*names)
+
+
+def conditional_get(*collections):
+    """Decorator adding ETag/Last-Modified validators to a GET resource.
+
+    The validators are derived from the request path and the version counters
+    of ``collections``, so a revalidation that matches returns 304 after one
+    Redis round trip without calling the resource or touching the database.
+    If Redis is unavailable the resource is served without validators.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            try:
+                versions = collection_versions(collections)
+            except Exception as e:
+                print(f"Collection version get error for {collections}: {e}")
+                return func(*args, **kwargs)
+
+            fingerprint = (
+                request.full_path
+                + "|"
+                + "|".join(
+                    f"{name}:{version}"
+                    for name, (version, _) in zip(collections, versions)
+                )
+            )
+            etag = hashlib.md5(fingerprint.encode()).hexdigest()
+            last_modified = datetime.fromtimestamp(
+                int(max(modified for _, modified in versions)), timezone.utc
+            )
+            headers = {
+                "ETag": f'"{etag}"',
+                "Last-Modified": last_modified.strftime("%a, %d %b %Y %H:%M:%S GMT"),
+                "Cache-Control": "private, no-cache",
+            }
+
+            if request.if_none_match:
+                not_modified = request.if_none_match.contains(etag)
+            else:
+                not_modified = (
+                    request.if_modified_since is not None
+                    and last_modified <= request.if_modified_since
+                )
+            if not_modified:
+                return Response(status=304, headers=headers)
+
+            result = func(*args, **kwargs)
+
+            if isinstance(result, tuple) and len(result) == 2 and result[1] == 200:
+                return result[0], 200, headers
+            return result
+
+        return wrapper
+
+    return decorator
+
+
 class CacheManager:
     """Cache manager for common operations"""
 
@@ -63,31 +628,50 @@ class CacheManager:
     def get_cached_data(key):
         """Get generic cached data by key"""
         try:
-            cached = redis_client.get(key)
+            cached = cached_get(key)
             if cached:
-                return json.loads(cached)
+                return cached
         except Exception as e:
             print(f"Cache get error for {key}: {e}")
         return None
 
     @staticmethod
-    def set_cached_data(key, data, expiration=5):
-        """Set generic cached data with key"""
+    def set_cached_data(key, data, expiration=5, tags=()):
+        """Set generic cached data with key, registered under ``tags``"""
         try:
-            redis_client.setex(key, expiration, json.dumps(data, default=str))
+            cached_set(key, data, expiration, tags)
             return True
         except Exception as e:
             print(f"Cache set error for {key}: {e}")
             return False
 
+    @staticmethod
+    def get_many(keys):
+        """Get ``{key: data}`` for the cached ``keys`` in one round trip"""
+        try:
+            return cached_get_many(keys)
+        except Exception as e:
+            print(f"Cache multi-get error: {e}")
+        return {}
+
+    @staticmethod
+    def set_many(data, expiration=5, tags=None):
+        """Set ``{key: data}`` in one round trip, ``tags`` mapping key to tags"""
+        try:
+            cached_set_many(data, expiration, tags)
+            return True
+        except Exception as e:
+            print(f"Cache multi-set error: {e}")
+            return False
+
     @staticmethod
     def get_subjects():
         """Get cached subjects"""
         cache_key = "subjects:all"
         try:
-            cached = redis_client.get(cache_key)
+            cached = cached_get(cache_key)
             if cached:
-                return json.loads(cached)
+                return cached
         except:
             pass
         return None
@@ -97,7 +681,7 @@ class CacheManager:
         """Cache subjects"""
         cache_key = "subjects:all"
         try:
-            redis_client.setex(cache_key, expiration, json.dumps(subjects, default=str))
+            cached_set(cache_key, subjects, expiration, tags=("subjects",))
         except Exception as e:
             print(f"Cache set error: {e}")
 
@@ -106,9 +690,9 @@ class CacheManager:
         """Get cached user quizzes"""
         cache_key = f"user_quizzes:{user_id}"
         try:
-            cached = redis_client.get(cache_key)
+            cached = cached_get(cache_key)
             if cached:
-                return json.loads(cached)
+                return cached
         except:
             pass
         return None
@@ -118,72 +702,36 @@ class CacheManager:
         """Cache user quizzes"""
         cache_key = f"user_quizzes:{user_id}"
         try:
-            redis_client.setex(cache_key, expiration, json.dumps(quizzes, default=str))
+            cached_set(
+                cache_key, quizzes, expiration, tags=(f"user:{user_id}", "dashboard")
+            )
         except Exception as e:
             print(f"Cache set error: {e}")
 
     @staticmethod
     def invalidate_user_cache(user_id):
         """Invalidate all cache for a user"""
-        pattern = f"user_quizzes:{user_id}*"
-        invalidate_cache(pattern)
+        invalidate_tags(f"user:{user_id}")
 
     @staticmethod
     def invalidate_quizzes_cache():
         """Invalidate all quizzes cache"""
-        invalidate_cache("quizzes:*")
+        invalidate_tags("quizzes")
 
     @staticmethod
     def invalidate_subjects_cache():
         """Invalidate subjects cache"""
-        invalidate_cache("subjects:*")
+        invalidate_tags("subjects")
 
     @staticmethod
     def invalidate_chapters_cache(subject_id=None):
         """Invalidate chapters cache for a specific subject or all chapters"""
         if subject_id:
-            invalidate_cache(f"chapters:subject:{subject_id}*")
+            invalidate_tags(f"subject:{subject_id}")
         else:
-            invalidate_cache("chapters:*")
+            invalidate_tags("chapters")
 
     @staticmethod
     def invalidate_dashboard_cache():
         """Invalidate dashboard cache for all users"""
-        invalidate_cache("user_quizzes:*")
-
-
-def rate_limit(max_requests=100, window=3600):
-    """Rate limiting decorator"""
-
-    def decorator(func):
-        @wraps(func)
-        def wrapper(*args, **kwargs):
-
-            client_ip = "127.0.0.1"
-
-            rate_key = f"rate_limit:{client_ip}:{func.__name__}"
-
-            try:
-
-                current_requests = redis_client.get(rate_key)
-
-                if current_requests is None:
-
-                    redis_client.setex(rate_key, window, 1)
-                elif int(current_requests) >= max_requests:
-
-                    return {"error": "Rate limit exceeded"}, 429
-                else:
-
-                    redis_client.incr(rate_key)
-
-            except Exception as e:
-                print(f"Rate limiting error: {e}")
-
-                pass
-
-            return func(*args, **kwargs)
-
-        return wrapper
-
-    return decorator
+        invalidate_tags("dashboard")
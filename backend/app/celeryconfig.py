@@ -1,10 +1,30 @@
 from celery.schedules import crontab
 
 beat_schedule = {
-    "calculate-ended-quiz-scores": {
-        "task": "app.tasks.calculate_ended_quiz_scores",
+    "finalize-due-quizzes": {
+        "task": "app.tasks.finalize_due_quizzes",
         "schedule": 10,
     },
+    "flush-answer-buffers": {
+        "task": "app.tasks.flush_answer_buffers",
+        "schedule": 15,
+    },
+    "warm-due-quiz-payloads": {
+        "task": "app.tasks.warm_due_quiz_payloads",
+        "schedule": 30,
+    },
+    "refresh-admin-dashboard": {
+        "task": "app.tasks.refresh_admin_dashboard",
+        "schedule": crontab(minute="*/5"),
+    },
+    "schedule-quiz-finalizations": {
+        "task": "app.tasks.schedule_quiz_finalizations",
+        "schedule": crontab(minute=0),
+    },
+    "refresh-user-average-index": {
+        "task": "app.tasks.refresh_user_average_index",
+        "schedule": crontab(minute=30),
+    },
     "send-daily-reminders": {
         "task": "app.tasks.send_daily_reminders",
         "schedule": 5,
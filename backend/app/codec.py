@@ -0,0 +1,239 @@
+import json
+import threading
+import time
+import zlib
+from datetime import date, datetime
+
+from app.config import Config
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# Every encoded value starts with a format byte, serializer << 3 | compression.
+# All format bytes are below 0x20, which never starts a JSON text, so values
+# stored as plain JSON before the byte existed are still readable. A new
+# format only adds values here: roll out readers before switching writers.
+SERIALIZER_JSON = 1
+SERIALIZER_ORJSON = 2
+SERIALIZER_MSGPACK = 3
+
+COMPRESSION_NONE = 0
+COMPRESSION_ZLIB = 1
+COMPRESSION_ZSTD = 2
+
+SERIALIZER_NAMES = {
+    SERIALIZER_JSON: "json",
+    SERIALIZER_ORJSON: "orjson",
+    SERIALIZER_MSGPACK: "msgpack",
+}
+COMPRESSION_NAMES = {
+    COMPRESSION_NONE: "none",
+    COMPRESSION_ZLIB: "zlib",
+    COMPRESSION_ZSTD: "zstd",
+}
+LEGACY_FORMAT = "json-text"
+
+# msgpack extension codes keeping dates and datetimes typed across a round
+# trip instead of turning them into strings.
+EXT_DATETIME = 1
+EXT_DATE = 2
+
+ZLIB_LEVEL = 6
+ZSTD_LEVEL = 3
+
+_zstd = threading.local()
+
+
+def _msgpack_default(value):
+    if isinstance(value, datetime):
+        return msgpack.ExtType(EXT_DATETIME, value.isoformat().encode())
+    if isinstance(value, date):
+        return msgpack.ExtType(EXT_DATE, value.isoformat().encode())
+    return str(value)
+
+
+def _msgpack_ext_hook(code, data):
+    if code == EXT_DATETIME:
+        return datetime.fromisoformat(data.decode())
+    if code == EXT_DATE:
+        return date.fromisoformat(data.decode())
+    return msgpack.ExtType(code, data)
+
+
+def _serialize(serializer, value):
+    if serializer == SERIALIZER_MSGPACK:
+        return msgpack.packb(value, default=_msgpack_default, use_bin_type=True)
+    if serializer == SERIALIZER_ORJSON:
+        return orjson.dumps(value, default=str, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, default=str).encode()
+
+
+def _deserialize(serializer, data):
+    if serializer == SERIALIZER_MSGPACK:
+        return msgpack.unpackb(
+            data, ext_hook=_msgpack_ext_hook, raw=False, strict_map_key=False
+        )
+    if serializer == SERIALIZER_ORJSON:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def _zstd_compressor():
+    # zstandard contexts must not be shared between threads
+    if not hasattr(_zstd, "compressor"):
+        _zstd.compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL)
+        _zstd.decompressor = zstandard.ZstdDecompressor()
+    return _zstd
+
+
+def _compress(compression, data):
+    if compression == COMPRESSION_ZSTD:
+        return _zstd_compressor().compressor.compress(data)
+    if compression == COMPRESSION_ZLIB:
+        return zlib.compress(data, ZLIB_LEVEL)
+    return data
+
+
+def _decompress(compression, data):
+    if compression == COMPRESSION_ZSTD:
+        return _zstd_compressor().decompressor.decompress(data)
+    if compression == COMPRESSION_ZLIB:
+        return zlib.decompress(data)
+    return data
+
+
+def _serializer_available(serializer):
+    modules = {SERIALIZER_MSGPACK: msgpack, SERIALIZER_ORJSON: orjson}
+    return modules.get(serializer, json) is not None
+
+
+def _compression_available(compression):
+    return compression != COMPRESSION_ZSTD or zstandard is not None
+
+
+def _choose(setting, preference, names, available):
+    """Pick the configured codec, or the first installed one for "auto" """
+    if setting == "auto":
+        return next(code for code in preference if available(code))
+    code = {name: code for code, name in names.items()}[setting]
+    if not available(code):
+        raise RuntimeError(f"Cache codec {setting} is configured but not installed")
+    return code
+
+
+SERIALIZER = _choose(
+    Config.CACHE_SERIALIZER,
+    (SERIALIZER_MSGPACK, SERIALIZER_ORJSON, SERIALIZER_JSON),
+    SERIALIZER_NAMES,
+    _serializer_available,
+)
+COMPRESSION = _choose(
+    Config.CACHE_COMPRESSION,
+    (COMPRESSION_ZSTD, COMPRESSION_ZLIB),
+    COMPRESSION_NAMES,
+    _compression_available,
+)
+
+# Encode/decode counters of this process, per format
+_stats = {}
+_stats_lock = threading.Lock()
+
+
+def _format_name(format_byte):
+    return (
+        f"{SERIALIZER_NAMES[format_byte >> 3]}"
+        f"+{COMPRESSION_NAMES[format_byte & 0b111]}"
+    )
+
+
+def _record(name, field, amount=1):
+    with _stats_lock:
+        counts = _stats.setdefault(
+            name,
+            {
+                "encoded": 0,
+                "decoded": 0,
+                "raw_bytes": 0,
+                "stored_bytes": 0,
+                "decode_seconds": 0.0,
+            },
+        )
+        counts[field] += amount
+
+
+def encode_value(value):
+    """Serialize ``value`` with the configured codec, compressing large values"""
+    data = _serialize(SERIALIZER, value)
+    compression = COMPRESSION_NONE
+    if len(data) >= Config.CACHE_COMPRESS_MIN_BYTES:
+        compression = COMPRESSION
+    format_byte = SERIALIZER << 3 | compression
+    encoded = bytes([format_byte]) + _compress(compression, data)
+
+    name = _format_name(format_byte)
+    _record(name, "encoded")
+    _record(name, "raw_bytes", len(data))
+    _record(name, "stored_bytes", len(encoded))
+    return encoded
+
+
+def decode_value(encoded):
+    """Inverse of ``encode_value``; also reads plain JSON written before it.
+
+    Raises ValueError for a format this process cannot read, such as one
+    written with an optional codec that is not installed here.
+    """
+    started = time.perf_counter()
+    format_byte = encoded[0]
+    if format_byte >= 0x20:
+        name = LEGACY_FORMAT
+        value = json.loads(encoded)
+    else:
+        serializer, compression = format_byte >> 3, format_byte & 0b111
+        if (
+            serializer not in SERIALIZER_NAMES
+            or compression not in COMPRESSION_NAMES
+            or not _serializer_available(serializer)
+            or not _compression_available(compression)
+        ):
+            raise ValueError(f"Unsupported cache value format {format_byte:#04x}")
+        name = _format_name(format_byte)
+        value = _deserialize(serializer, _decompress(compression, encoded[1:]))
+
+    _record(name, "decoded")
+    _record(name, "decode_seconds", time.perf_counter() - started)
+    return value
+
+
+def codec_stats():
+    """Counters per format with the average decode time in microseconds"""
+    with _stats_lock:
+        formats = {name: dict(counts) for name, counts in _stats.items()}
+    for counts in formats.values():
+        counts["avg_decode_us"] = (
+            round(counts["decode_seconds"] / counts["decoded"] * 1e6, 1)
+            if counts["decoded"]
+            else None
+        )
+        counts["compression_ratio"] = (
+            round(counts["stored_bytes"] / counts["raw_bytes"], 3)
+            if counts["raw_bytes"]
+            else None
+        )
+    return {
+        "serializer": SERIALIZER_NAMES[SERIALIZER],
+        "compression": COMPRESSION_NAMES[COMPRESSION],
+        "formats": formats,
+    }
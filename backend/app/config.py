@@ -25,3 +25,37 @@ class Config:
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
     REDIS_URL = "redis://localhost:6379/0"
+
+    # In-process cache tier in front of Redis, per web or worker process.
+    # Entries are dropped on invalidation broadcasts and live at most
+    # LOCAL_CACHE_TTL seconds in case a broadcast is missed.
+    LOCAL_CACHE_MAX_ENTRIES = 1024
+    LOCAL_CACHE_TTL = 30
+
+    # Encoding of cached values in Redis. "auto" picks msgpack with zstd, both
+    # dependencies of the project; msgpack keeps dates and datetimes typed.
+    # Without them it falls back to orjson, then the standard json module, and
+    # to zlib, and dates come back from the cache as ISO strings.
+    # Values of at least CACHE_COMPRESS_MIN_BYTES are compressed.
+    CACHE_SERIALIZER = "auto"
+    CACHE_COMPRESSION = "auto"
+    CACHE_COMPRESS_MIN_BYTES = 1024
+
+    # Buffer answers for live quizzes in Redis and flush them to the database
+    # in bulk. Requires Redis persistence (appendonly yes, appendfsync always)
+    # so that an acknowledged answer survives a Redis restart.
+    ANSWER_BUFFER_ENABLED = False
+
+    # Number of reverse proxies in front of the app that append to
+    # X-Forwarded-For. The client address is taken that many entries from the
+    # right; 0 ignores the header, so clients cannot choose their own address.
+    TRUSTED_PROXY_HOPS = 0
+
+    # Requests allowed per client and window in seconds, by endpoint name.
+    # Clients are identified by JWT identity, else by their IP address; see
+    # app/ratelimit.py. Endpoints not listed here are not limited.
+    RATE_LIMITS = {
+        "login": (10, 60),
+        "takeResponse": (120, 60),
+        "takeResponses": (30, 60),
+    }
@@ -2,10 +2,19 @@ from datetime import datetime
 
 from flask_login import UserMixin
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.dialects import postgresql, sqlite
 
 db = SQLAlchemy()
 
 
+def insert_for(model):
+    """Return a dialect-specific INSERT for ``model`` that supports ON CONFLICT."""
+    if db.engine.dialect.name == "postgresql":
+        return postgresql.insert(model)
+    return sqlite.insert(model)
+
+
 from datetime import datetime, timedelta, timezone
 
 from werkzeug.security import check_password_hash, generate_password_hash
@@ -20,6 +29,7 @@ class User(UserMixin, db.Model):
     qualification = db.Column(db.String(140))
     date_of_birth = db.Column(db.DateTime)
     role = db.Column(db.String(20), default="user")
+    created_at = db.Column(db.DateTime, index=True, default=datetime.now)
     scores = db.relationship("Score", backref="user", lazy="dynamic")
     preferences_id = db.Column(
         db.Integer, db.ForeignKey("user_preferences.id"), nullable=True
@@ -53,10 +63,56 @@ class Quiz(db.Model):
     subject_id = db.Column(db.Integer, db.ForeignKey("subject.id"))
     questions_id = db.relationship("Question", backref="quiz", lazy="dynamic")
     started = db.Column(db.Boolean, default=False)
+    starts_at = db.Column(db.DateTime, index=True)
+    ends_at = db.Column(db.DateTime, index=True)
 
     def __repr__(self):
         return "<Quiz {}>".format(self.id)
 
+    def refresh_window(self):
+        """Recompute ``starts_at``/``ends_at`` from the date, time and duration"""
+        if self.date_of_quiz is None:
+            self.starts_at = self.ends_at = None
+            return
+        self.starts_at = datetime.combine(
+            self.date_of_quiz, self.time_of_day or datetime.min.time()
+        )
+        self.ends_at = self.starts_at + timedelta(minutes=self.time_duration or 0)
+
+    @classmethod
+    def upcoming(cls, now, until=None):
+        """Quizzes that have not started yet, optionally starting before ``until``"""
+        query = cls.query.filter(cls.starts_at > now)
+        if until is not None:
+            query = query.filter(cls.starts_at <= until)
+        return query
+
+    @classmethod
+    def live(cls, now):
+        """Quizzes in progress at ``now``"""
+        return cls.query.filter(cls.starts_at <= now, cls.ends_at > now)
+
+    @classmethod
+    def not_ended(cls, now):
+        """Quizzes that are upcoming or in progress at ``now``"""
+        return cls.query.filter(cls.ends_at > now)
+
+    @classmethod
+    def ended_between(cls, start, end):
+        """Quizzes whose end time falls within ``[start, end]``"""
+        return cls.query.filter(cls.ends_at >= start, cls.ends_at <= end)
+
+    @classmethod
+    def ended_before(cls, now):
+        """Quizzes that ended at or before ``now``"""
+        return cls.query.filter(cls.ends_at <= now)
+
+
+@event.listens_for(Quiz, "before_insert")
+@event.listens_for(Quiz, "before_update")
+def _sync_quiz_window(mapper, connection, quiz):
+    quiz.refresh_window()
+
 
 class Question(db.Model):
 
@@ -67,7 +123,7 @@ class Question(db.Model):
     option3 = db.Column(db.String(140))
     option4 = db.Column(db.String(140))
     answer = db.Column(db.String(140))
-    quiz_id = db.Column(db.Integer, db.ForeignKey("quiz.id"))
+    quiz_id = db.Column(db.Integer, db.ForeignKey("quiz.id"), index=True)
     marks = db.Column(db.Integer, default=1)
     chapter_id = db.Column(db.Integer, db.ForeignKey("chapter.id"))
     subject_id = db.Column(db.Integer, db.ForeignKey("subject.id"))
@@ -77,6 +133,11 @@ class Question(db.Model):
 
 
 class Score(db.Model):
+    __table_args__ = (
+        db.Index("ux_score_user_quiz", "user_id", "quiz_id", unique=True),
+        # Serves the newest-first score history pages.
+        db.Index("ix_score_user_timestamp", "user_id", "timestamp", "id"),
+    )
 
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"))
@@ -88,6 +149,83 @@ class Score(db.Model):
         return "<Score {}>".format(self.score)
 
 
+class UserStats(db.Model):
+    """Running totals of a user's graded scores, maintained by grading"""
+
+    __tablename__ = "user_stats"
+
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    quizzes_taken = db.Column(db.Integer, default=0, nullable=False)
+    total_points = db.Column(db.Integer, default=0, nullable=False)
+    best_score = db.Column(db.Integer)
+    worst_score = db.Column(db.Integer)
+    perfect_scores = db.Column(db.Integer, default=0, nullable=False)
+    questions_answered = db.Column(db.Integer, default=0, nullable=False)
+    correct_answers = db.Column(db.Integer, default=0, nullable=False)
+    last_attempt_at = db.Column(db.DateTime)
+
+    @property
+    def average_score(self):
+        return self.total_points / self.quizzes_taken if self.quizzes_taken else 0
+
+    def __repr__(self):
+        return "<UserStats {}>".format(self.user_id)
+
+
+class UserSubjectStats(db.Model):
+    """Per-subject running totals of a user's graded scores"""
+
+    __tablename__ = "user_subject_stats"
+
+    user_id = db.Column(db.Integer, db.ForeignKey("user.id"), primary_key=True)
+    subject_id = db.Column(db.Integer, db.ForeignKey("subject.id"), primary_key=True)
+    quizzes_taken = db.Column(db.Integer, default=0, nullable=False)
+    total_points = db.Column(db.Integer, default=0, nullable=False)
+    best_score = db.Column(db.Integer)
+    worst_score = db.Column(db.Integer)
+    last_attempt_at = db.Column(db.DateTime)
+
+    @property
+    def average_score(self):
+        return self.total_points / self.quizzes_taken if self.quizzes_taken else 0
+
+    def __repr__(self):
+        return "<UserSubjectStats {} {}>".format(self.user_id, self.subject_id)
+
+
+class QuizStats(db.Model):
+    """Running totals of the graded scores of a quiz, maintained by grading"""
+
+    __tablename__ = "quiz_stats"
+
+    quiz_id = db.Column(db.Integer, db.ForeignKey("quiz.id"), primary_key=True)
+    attempts = db.Column(db.Integer, default=0, nullable=False)
+    total_points = db.Column(db.Integer, default=0, nullable=False)
+    min_score = db.Column(db.Integer)
+    max_score = db.Column(db.Integer)
+
+    @property
+    def average_score(self):
+        return self.total_points / self.attempts if self.attempts else 0
+
+    def __repr__(self):
+        return "<QuizStats {}>".format(self.quiz_id)
+
+
+class QuizScoreBin(db.Model):
+    """Histogram of a quiz's scores; bin ``n`` counts scores ``10n``-``10n+9``
+    and bin 10 counts perfect scores"""
+
+    __tablename__ = "quiz_score_bin"
+
+    quiz_id = db.Column(db.Integer, db.ForeignKey("quiz.id"), primary_key=True)
+    bin = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    count = db.Column(db.Integer, default=0, nullable=False)
+
+    def __repr__(self):
+        return "<QuizScoreBin {} {}>".format(self.quiz_id, self.bin)
+
+
 class Subject(db.Model):
 
     id = db.Column(db.Integer, primary_key=True)
@@ -112,6 +250,16 @@ class Chapter(db.Model):
 
 
 class QuizResponse(db.Model):
+    __table_args__ = (
+        db.Index(
+            "ux_quiz_response_quiz_user_question",
+            "quiz_id",
+            "user_id",
+            "question_id",
+            unique=True,
+        ),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
     quiz_id = db.Column(db.Integer, db.ForeignKey("quiz.id"))
     user_id = db.Column(db.Integer, db.ForeignKey("user.id"))
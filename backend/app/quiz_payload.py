@@ -0,0 +1,125 @@
+import hashlib
+import json
+
+from app.cache import redis_client
+from app.models import Chapter, Question, Quiz, Subject, db
+
+# Every content change bumps the version, so readers move to a fresh key and
+# a payload built from data read before the change can only land on a key
+# nobody reads anymore. Old versions simply expire.
+VERSION_KEY = "quiz_payload:version:{quiz_id}"
+PAYLOAD_KEY = "quiz_payload:{quiz_id}:{version}"
+
+PAYLOAD_TTL = 24 * 60 * 60
+
+
+def build_quiz_payload(quiz_id):
+    """Build the student-facing quiz payload, or None if the quiz is missing"""
+    quiz = (
+        db.session.query(Quiz, Subject.name, Chapter.name)
+        .outerjoin(Subject, Subject.id == Quiz.subject_id)
+        .outerjoin(Chapter, Chapter.id == Quiz.chapter_id)
+        .filter(Quiz.id == quiz_id)
+        .first()
+    )
+    if not quiz:
+        return None
+    quiz, subject_name, chapter_name = quiz
+
+    questions = Question.query.filter_by(quiz_id=quiz_id).order_by(Question.id).all()
+
+    return {
+        "data": {
+            "quiz_id": quiz.id,
+            "quiz_title": quiz.quiz_title,
+            "number_of_questions": len(questions),
+            "time_duration": quiz.time_duration,
+            "time_of_day": quiz.time_of_day.isoformat() if quiz.time_of_day else None,
+            "subject_name": subject_name,
+            "chapter_name": chapter_name,
+            "questions": [
+                {
+                    "id": question.id,
+                    "question": question.question,
+                    "options": [
+                        question.option1,
+                        question.option2,
+                        question.option3,
+                        question.option4,
+                    ],
+                    "marks": question.marks,
+                }
+                for question in questions
+            ],
+        }
+    }
+
+
+def _encode(payload):
+    """Serialize a payload once and derive its strong ETag from the bytes"""
+    body = json.dumps(payload, separators=(",", ":"), default=str)
+    return body, hashlib.sha256(body.encode()).hexdigest()[:32]
+
+
+def get_quiz_payload(quiz_id):
+    """Return ``(body, etag)`` for a quiz, or ``(None, None)`` if it is missing.
+
+    A cache hit is two Redis reads and no database access. On a miss the
+    payload is built, encoded and stored under the current version. If Redis
+    is unavailable the payload is built and served without caching.
+    """
+    try:
+        version = redis_client.get(VERSION_KEY.format(quiz_id=quiz_id)) or 0
+        key = PAYLOAD_KEY.format(quiz_id=quiz_id, version=version)
+        body, etag = redis_client.hmget(key, "body", "etag")
+        if body and etag:
+            return body, etag
+    except Exception as e:
+        print(f"Quiz payload cache get error for {quiz_id}: {e}")
+        key = None
+
+    payload = build_quiz_payload(quiz_id)
+    if payload is None:
+        return None, None
+
+    body, etag = _encode(payload)
+
+    if key:
+        try:
+            pipe = redis_client.pipeline(transaction=True)
+            pipe.hset(key, mapping={"body": body, "etag": etag})
+            pipe.expire(key, PAYLOAD_TTL)
+            pipe.execute()
+        except Exception as e:
+            print(f"Quiz payload cache set error for {quiz_id}: {e}")
+
+    return body, etag
+
+
+def invalidate_quiz_payload(quiz_id):
+    """Retire the cached payload for a quiz. Call after the commit."""
+    try:
+        redis_client.incr(VERSION_KEY.format(quiz_id=quiz_id))
+    except Exception as e:
+        print(f"Quiz payload invalidation error for {quiz_id}: {e}")
+
+
+def invalidate_quiz_payloads(quiz_ids):
+    """Retire the cached payloads of several quizzes in one round trip, e.g.
+    after renaming or deleting the subject or chapter they show. Call after
+    the commit."""
+    if not quiz_ids:
+        return
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        for quiz_id in quiz_ids:
+            pipe.incr(VERSION_KEY.format(quiz_id=quiz_id))
+        pipe.execute()
+    except Exception as e:
+        print(f"Quiz payload invalidation error for {len(quiz_ids)} quizzes: {e}")
+
+
+def warm_quiz_payload(quiz_id):
+    """Build and cache the payload ahead of time. Returns False if missing."""
+    body, _ = get_quiz_payload(quiz_id)
+    return body is not None
@@ -0,0 +1,262 @@
+import logging
+
+from app.cache import invalidate_tags, redis_client
+from app.models import Score, User, UserStats, UserSubjectStats, db
+from app.score_history import SCORE_HISTORY_TAG
+from sqlalchemy import case, func
+
+# Average score of every ranked user, kept sorted by Redis. Grading updates
+# the users it scored right after commit, and refresh_user_averages rebuilds
+# the whole set hourly, so a missed update is corrected within an hour.
+USER_AVERAGE_KEY = "stats:user_avg"
+
+# Leaderboards: a quiz board holds each user's score on that quiz, subject
+# and global boards hold total points. All are written with absolute values
+# after the grading commit, so replaying an update is harmless, and a board
+# that has gone missing is rebuilt from the database on first read.
+LEADERBOARD_SCOPES = ("quiz", "subject", "global")
+LEADERBOARD_KEY = "leaderboard:{scope}:{scope_id}"
+
+# Member's score, competition rank (1 + members strictly above) and board size
+# in one round trip.
+_RANK_SCRIPT = """
+local score = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if not score then
+    return {false, false, redis.call('ZCARD', KEYS[1])}
+end
+local above = redis.call('ZCOUNT', KEYS[1], '(' .. score, '+inf')
+return {score, above + 1, redis.call('ZCARD', KEYS[1])}
+"""
+_rank_member = redis_client.register_script(_RANK_SCRIPT)
+
+
+def _ranked_averages(user_ids=None):
+    """``(user_id, average)`` for users with role "user" and at least one score"""
+    query = (
+        db.session.query(
+            UserStats.user_id,
+            UserStats.total_points * 1.0 / UserStats.quizzes_taken,
+        )
+        .join(User, User.id == UserStats.user_id)
+        .filter(User.role == "user", UserStats.quizzes_taken > 0)
+    )
+    if user_ids is not None:
+        query = query.filter(UserStats.user_id.in_(user_ids))
+    return query.all()
+
+
+def update_user_averages(user_ids):
+    """Push the current averages of ``user_ids`` into the sorted set"""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+
+    try:
+        if not redis_client.exists(USER_AVERAGE_KEY):
+            refresh_user_averages()
+            return
+
+        averages = dict(_ranked_averages(user_ids))
+        pipe = redis_client.pipeline(transaction=True)
+        if averages:
+            pipe.zadd(USER_AVERAGE_KEY, averages)
+        unranked = user_ids - set(averages)
+        if unranked:
+            pipe.zrem(USER_AVERAGE_KEY, *unranked)
+        pipe.execute()
+    except Exception as e:
+        print(f"User average index update error: {e}")
+
+
+def refresh_user_averages():
+    """Rebuild the sorted set from ``UserStats`` and swap it in atomically"""
+    averages = dict(_ranked_averages())
+
+    staging_key = f"{USER_AVERAGE_KEY}:rebuild"
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.delete(staging_key)
+    if averages:
+        pipe.zadd(staging_key, averages)
+        pipe.rename(staging_key, USER_AVERAGE_KEY)
+    else:
+        pipe.delete(USER_AVERAGE_KEY)
+    pipe.execute()
+
+    logging.info(f"Rebuilt user average index with {len(averages)} users")
+    return len(averages)
+
+
+def user_average_percentile(average):
+    """Share of ranked users, in percent, whose average is below ``average``.
+
+    Two O(log n) Redis calls. Falls back to one aggregate query when Redis is
+    unavailable, and rebuilds the set if it has gone missing.
+    """
+    try:
+        pipe = redis_client.pipeline(transaction=False)
+        pipe.zcount(USER_AVERAGE_KEY, "-inf", f"({average}")
+        pipe.zcard(USER_AVERAGE_KEY)
+        below, total = pipe.execute()
+
+        if not total and refresh_user_averages():
+            pipe.zcount(USER_AVERAGE_KEY, "-inf", f"({average}")
+            pipe.zcard(USER_AVERAGE_KEY)
+            below, total = pipe.execute()
+    except Exception as e:
+        print(f"User average index read error: {e}")
+        below, total = _percentile_counts_from_database(average)
+
+    return round(below / total * 100, 1) if total else 0
+
+
+def _percentile_counts_from_database(average):
+    user_average = UserStats.total_points * 1.0 / UserStats.quizzes_taken
+    total, below = (
+        db.session.query(
+            func.count(UserStats.user_id),
+            func.sum(case((user_average < average, 1), else_=0)),
+        )
+        .join(User, User.id == UserStats.user_id)
+        .filter(User.role == "user", UserStats.quizzes_taken > 0)
+        .one()
+    )
+    return below or 0, total
+
+
+def leaderboard_key(scope, scope_id=None):
+    return LEADERBOARD_KEY.format(
+        scope=scope, scope_id="all" if scope == "global" else scope_id
+    )
+
+
+def _board_entries(scope, scope_id, user_ids=None):
+    """``{user_id: value}`` for a board, read from the database"""
+    if scope == "quiz":
+        query = db.session.query(Score.user_id, Score.score).filter(
+            Score.quiz_id == scope_id, Score.user_id.isnot(None)
+        )
+        user_column = Score.user_id
+    elif scope == "subject":
+        query = db.session.query(
+            UserSubjectStats.user_id, UserSubjectStats.total_points
+        ).filter(UserSubjectStats.subject_id == scope_id)
+        user_column = UserSubjectStats.user_id
+    else:
+        query = db.session.query(UserStats.user_id, UserStats.total_points).filter(
+            UserStats.quizzes_taken > 0
+        )
+        user_column = UserStats.user_id
+
+    if user_ids is not None:
+        query = query.filter(user_column.in_(user_ids))
+    return dict(query.all())
+
+
+def rebuild_leaderboard(scope, scope_id=None):
+    """Replace one board with the values stored in the database"""
+    key = leaderboard_key(scope, scope_id)
+    entries = _board_entries(scope, scope_id)
+
+    staging_key = f"{key}:rebuild"
+    pipe = redis_client.pipeline(transaction=True)
+    pipe.delete(staging_key)
+    if entries:
+        pipe.zadd(staging_key, entries)
+        pipe.rename(staging_key, key)
+    else:
+        pipe.delete(key)
+    pipe.execute()
+    return len(entries)
+
+
+def _ensure_leaderboards(boards):
+    """Rebuild any of the ``(scope, scope_id)`` boards missing from Redis"""
+    boards = list(boards)
+    pipe = redis_client.pipeline(transaction=False)
+    for scope, scope_id in boards:
+        pipe.exists(leaderboard_key(scope, scope_id))
+    for (scope, scope_id), exists in zip(boards, pipe.execute()):
+        if not exists:
+            rebuild_leaderboard(scope, scope_id)
+
+
+def update_leaderboards(quiz, user_ids):
+    """Write the current quiz, subject and global values of ``user_ids``"""
+    user_ids = set(user_ids)
+    if not user_ids:
+        return
+
+    boards = [("quiz", quiz.id), ("global", None)]
+    if quiz.subject_id is not None:
+        boards.append(("subject", quiz.subject_id))
+
+    try:
+        # A board lost with Redis data is rebuilt whole rather than refilled
+        # with just these users.
+        _ensure_leaderboards(boards)
+
+        pipe = redis_client.pipeline(transaction=True)
+        for scope, scope_id in boards:
+            entries = _board_entries(scope, scope_id, user_ids)
+            if entries:
+                pipe.zadd(leaderboard_key(scope, scope_id), entries)
+        pipe.execute()
+    except Exception as e:
+        print(f"Leaderboard update error for quiz {quiz.id}: {e}")
+
+
+def publish_scores(quiz, results):
+    """Push freshly committed grading results into the Redis rankings and
+    drop the graded users' cached score histories and statistics"""
+    user_ids = {result["user_id"] for result in results}
+    update_user_averages(user_ids)
+    update_leaderboards(quiz, user_ids)
+    invalidate_tags(
+        *(SCORE_HISTORY_TAG.format(identity=uid) for uid in user_ids),
+        *(f"user:{uid}" for uid in user_ids),
+    )
+
+
+def leaderboard_top(scope, scope_id=None, limit=10):
+    """Return the best ``limit`` entries as ``(rank, user_id, value)``.
+
+    Tied values share a rank, as in "1, 2, 2, 4".
+    """
+    _ensure_leaderboards([(scope, scope_id)])
+    entries = redis_client.zrevrange(
+        leaderboard_key(scope, scope_id), 0, limit - 1, withscores=True
+    )
+
+    top = []
+    for position, (member, value) in enumerate(entries):
+        if top and value == top[-1][2]:
+            rank = top[-1][0]
+        else:
+            rank = position + 1
+        top.append((rank, int(member), value))
+    return top
+
+
+def leaderboard_ranks(boards, user_id):
+    """Return ``{(scope, scope_id): (rank, value, size)}`` for ``user_id``.
+
+    ``rank`` and ``value`` are None on boards the user is not on. Every board
+    is answered in one pipelined round trip.
+    """
+    boards = list(boards)
+    _ensure_leaderboards(boards)
+
+    pipe = redis_client.pipeline(transaction=False)
+    for scope, scope_id in boards:
+        _rank_member(
+            keys=[leaderboard_key(scope, scope_id)], args=[user_id], client=pipe
+        )
+
+    ranks = {}
+    for board, (value, rank, size) in zip(boards, pipe.execute()):
+        ranks[board] = (
+            rank,
+            float(value) if value is not None else None,
+            size,
+        )
+    return ranks
@@ -0,0 +1,160 @@
+import math
+import threading
+import time
+from functools import wraps
+
+from app.cache import redis_client
+from app.config import Config
+from flask import after_this_request, request
+from flask_jwt_extended import get_jwt_identity, verify_jwt_in_request
+
+RATE_LIMIT_KEY = "ratelimit:{scope}:{client}"
+
+# GCRA token bucket. The key holds the theoretical arrival time (TAT) in
+# milliseconds: every allowed request pushes it one emission interval into
+# the future, and a request is refused while the TAT is more than a full
+# burst ahead of now. The clock is Redis's own, so app servers with skewed
+# clocks share one bucket correctly. Returns allowed (1/0), remaining
+# requests, milliseconds until a retry can succeed and milliseconds until
+# the bucket is full again.
+_GCRA_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = now_parts[1] * 1000 + math.floor(now_parts[2] / 1000)
+local interval = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+
+local tat = tonumber(redis.call('GET', KEYS[1])) or now
+if tat < now then
+    tat = now
+end
+
+local allow_at = tat + interval - interval * burst
+if now < allow_at then
+    return {0, 0, allow_at - now, tat - now}
+end
+
+local new_tat = tat + interval
+redis.call('SET', KEYS[1], new_tat, 'PX', new_tat - now)
+return {1, math.floor((now - allow_at) / interval), 0, new_tat - now}
+"""
+_gcra = redis_client.register_script(_GCRA_SCRIPT)
+
+
+class LocalRateLimiter:
+    """Per-process GCRA used while Redis is unavailable.
+
+    Each process enforces the limit on its own, so the effective limit is
+    multiplied by the number of processes until Redis is back.
+    """
+
+    # Buckets kept before idle ones are dropped
+    MAX_BUCKETS = 10000
+
+    def __init__(self):
+        self._tats = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key, interval, burst):
+        now = time.monotonic() * 1000
+        with self._lock:
+            if len(self._tats) >= self.MAX_BUCKETS:
+                self._tats = {k: t for k, t in self._tats.items() if t > now}
+
+            tat = max(self._tats.get(key, now), now)
+            allow_at = tat + interval - interval * burst
+            if now < allow_at:
+                return False, 0, allow_at - now, tat - now
+
+            self._tats[key] = tat + interval
+            return (
+                True,
+                math.floor((now - allow_at) / interval),
+                0,
+                tat + interval - now,
+            )
+
+
+local_limiter = LocalRateLimiter()
+
+
+def client_identity():
+    """JWT identity of the caller, else their IP address.
+
+    The address is ``request.remote_addr``, which only reflects
+    X-Forwarded-For up to ``Config.TRUSTED_PROXY_HOPS`` proxies.
+    """
+    try:
+        verify_jwt_in_request(optional=True)
+        identity = get_jwt_identity()
+        if identity:
+            return f"user:{identity}"
+    except Exception:
+        pass
+
+    return f"ip:{request.remote_addr}"
+
+
+def check_rate_limit(scope, limit, period):
+    """Count one request against ``scope`` for the current client.
+
+    Returns ``(allowed, headers)``; falls back to the in-process limiter
+    when Redis is unavailable.
+    """
+    key = RATE_LIMIT_KEY.format(scope=scope, client=client_identity())
+    # Whole milliseconds, since SET ... PX rejects a fractional expiry
+    interval = math.ceil(period * 1000 / limit)
+
+    try:
+        allowed, remaining, retry_after, reset_after = _gcra(
+            keys=[key], args=[interval, limit]
+        )
+    except Exception as e:
+        print(f"Rate limiting error for {scope}: {e}")
+        allowed, remaining, retry_after, reset_after = local_limiter.hit(
+            key, interval, limit
+        )
+
+    headers = {
+        "X-RateLimit-Limit": str(limit),
+        "X-RateLimit-Remaining": str(int(remaining)),
+        "X-RateLimit-Reset": str(math.ceil(float(reset_after) / 1000)),
+    }
+    if not allowed:
+        headers["Retry-After"] = str(math.ceil(float(retry_after) / 1000))
+    return bool(allowed), headers
+
+
+def rate_limit(scope=None, limit=None, period=None):
+    """Decorator limiting a Resource method per client.
+
+    ``scope`` defaults to the request endpoint, and ``limit`` requests per
+    ``period`` seconds default to ``Config.RATE_LIMITS[scope]``. Endpoints
+    without a configured limit are not limited. Clients are told their
+    budget in X-RateLimit-* headers and get a 429 with Retry-After when it
+    is spent.
+    """
+
+    def decorator(func):
+        @wraps(func)
+        def wrapper(*args, **kwargs):
+            name = scope or request.endpoint
+            configured = Config.RATE_LIMITS.get(name)
+            max_requests = limit or (configured and configured[0])
+            window = period or (configured and configured[1])
+            if not max_requests or not window:
+                return func(*args, **kwargs)
+
+            allowed, headers = check_rate_limit(name, max_requests, window)
+            if not allowed:
+                return {"error": "Rate limit exceeded"}, 429, headers
+
+            @after_this_request
+            def add_rate_limit_headers(response):
+                response.headers.extend(headers)
+                return response
+
+            return func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
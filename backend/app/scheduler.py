@@ -0,0 +1,81 @@
+from datetime import datetime, timedelta
+
+from app.cache import redis_client
+
+# Atomically claim members whose due time has passed, so each member is handed
+# to exactly one caller even with several beat processes or workers.
+_POP_DUE_SCRIPT = """
+local due = redis.call('ZRANGEBYSCORE', KEYS[1], '-inf', ARGV[1], 'LIMIT', 0, ARGV[2])
+if #due > 0 then
+    redis.call('ZREM', KEYS[1], unpack(due))
+end
+return due
+"""
+
+
+class DelayQueue:
+    """Redis sorted set of members scored by the time they become due.
+
+    Scheduling an existing member again moves it, so rescheduling is a single
+    ZADD, and polling an idle queue is one O(log n) call that never touches
+    the database.
+    """
+
+    def __init__(self, name):
+        self.key = f"delay_queue:{name}"
+        self._pop_due = redis_client.register_script(_POP_DUE_SCRIPT)
+
+    def schedule(self, member, when):
+        """Schedule ``member`` to become due at ``when``"""
+        try:
+            redis_client.zadd(self.key, {member: when.timestamp()})
+            return True
+        except Exception as e:
+            print(f"Delay queue schedule error for {self.key}: {e}")
+            return False
+
+    def cancel(self, member):
+        """Remove ``member`` from the queue"""
+        try:
+            redis_client.zrem(self.key, member)
+        except Exception as e:
+            print(f"Delay queue cancel error for {self.key}: {e}")
+
+    def pop_due(self, now=None, limit=100):
+        """Claim and return up to ``limit`` members due at or before ``now``"""
+        now = now or datetime.now()
+        return self._pop_due(keys=[self.key], args=[now.timestamp(), limit])
+
+
+finalization_queue = DelayQueue("quiz_finalization")
+
+
+def schedule_quiz_finalization(quiz):
+    """Queue ``quiz`` to be graded when it ends, replacing any earlier schedule"""
+    if quiz.ends_at is None:
+        return False
+    return finalization_queue.schedule(quiz.id, quiz.ends_at)
+
+
+def cancel_quiz_finalization(quiz_id):
+    """Drop a pending grading job, e.g. when the quiz is deleted"""
+    finalization_queue.cancel(quiz_id)
+
+
+# Cache the quiz payload shortly before the quiz opens, so the burst of
+# students fetching it at the start time is served from Redis.
+QUIZ_WARMUP_LEAD = timedelta(minutes=10)
+
+warmup_queue = DelayQueue("quiz_payload_warmup")
+
+
+def schedule_quiz_warmup(quiz):
+    """Queue the payload of ``quiz`` to be cached ahead of its start time"""
+    if quiz.starts_at is None:
+        return False
+    return warmup_queue.schedule(quiz.id, quiz.starts_at - QUIZ_WARMUP_LEAD)
+
+
+def cancel_quiz_warmup(quiz_id):
+    """Drop a pending payload warmup, e.g. when the quiz is deleted"""
+    warmup_queue.cancel(quiz_id)
@@ -0,0 +1,161 @@
+import logging
+
+import click
+from app.models import Quiz, QuizResponse, QuizStats, Score, UserStats, db
+from app.stats import rebuild_quiz_stats, rebuild_user_stats
+from flask.cli import with_appcontext
+from sqlalchemy import delete, func, inspect, select, text
+
+# Unique indexes that an existing database may hold duplicates for, with the
+# model, the key columns and which row of each duplicate key is kept. The
+# first score is kept since grading never replaces one, and the latest answer
+# since it superseded the earlier ones. sync_schema does not create these
+# indexes while duplicates exist; ``flask deduplicate`` removes them
+# explicitly.
+DEDUPLICATED_INDEXES = {
+    "ux_score_user_quiz": (Score, ("user_id", "quiz_id"), "first"),
+    "ux_quiz_response_quiz_user_question": (
+        QuizResponse,
+        ("quiz_id", "user_id", "question_id"),
+        "last",
+    ),
+}
+
+# Rows deleted per statement by ``flask deduplicate``
+DEDUPLICATE_BATCH_SIZE = 500
+
+
+def sync_schema():
+    """Bring an existing database up to date with the models.
+
+    ``db.create_all`` only creates missing tables, so columns and indexes added
+    to models that already have a table are applied here. Every step is
+    idempotent and safe to run on each start.
+    """
+    with db.engine.begin() as conn:
+        inspector = inspect(conn)
+        preparer = conn.dialect.identifier_preparer
+
+        for table in db.metadata.tables.values():
+            if not inspector.has_table(table.name):
+                continue
+
+            existing_columns = {c["name"] for c in inspector.get_columns(table.name)}
+            for column in table.columns:
+                if column.name in existing_columns:
+                    continue
+                column_type = column.type.compile(dialect=conn.dialect)
+                conn.execute(
+                    text(
+                        f"ALTER TABLE {preparer.format_table(table)} "
+                        f"ADD COLUMN {preparer.format_column(column)} {column_type}"
+                    )
+                )
+                logging.info(f"Added column {table.name}.{column.name}")
+
+            existing_indexes = {i["name"] for i in inspector.get_indexes(table.name)}
+            for index in table.indexes:
+                if index.name in existing_indexes:
+                    continue
+                if index.name in DEDUPLICATED_INDEXES:
+                    duplicates = len(find_duplicates(conn, index.name))
+                    if duplicates:
+                        logging.error(
+                            f"Not creating {index.name}: {table.name} has "
+                            f"{duplicates} duplicate rows. Review and remove them "
+                            f"with `flask deduplicate {index.name}`."
+                        )
+                        continue
+                index.create(bind=conn)
+                logging.info(f"Created index {index.name}")
+
+    backfill_quiz_windows()
+    backfill_user_stats()
+    backfill_quiz_stats()
+
+
+def find_duplicates(conn, index_name):
+    """Rows that keep the unique index ``index_name`` from being created.
+
+    One row of each duplicate key is kept and not returned. Rows with a NULL
+    key column are never duplicates, since unique indexes allow repeated NULLs.
+    """
+    model, columns, keep = DEDUPLICATED_INDEXES[index_name]
+    table = model.__table__
+    key = [table.c[name] for name in columns]
+    keep_id = func.min(table.c.id) if keep == "first" else func.max(table.c.id)
+
+    return conn.execute(
+        select(table)
+        .where(
+            *[column.isnot(None) for column in key],
+            table.c.id.notin_(select(keep_id).group_by(*key)),
+        )
+        .order_by(table.c.id)
+    ).all()
+
+
+@click.command("deduplicate")
+@click.argument("index_name", type=click.Choice(sorted(DEDUPLICATED_INDEXES)))
+@click.option("--dry-run", is_flag=True, help="List the rows without deleting them.")
+@with_appcontext
+def deduplicate_command(index_name, dry_run):
+    """Delete the duplicate rows blocking a unique index, then create it.
+
+    Every removed row is printed in full so it can be restored by hand.
+    """
+    model = DEDUPLICATED_INDEXES[index_name][0]
+    table = model.__table__
+    index = next(index for index in table.indexes if index.name == index_name)
+
+    with db.engine.begin() as conn:
+        rows = find_duplicates(conn, index_name)
+        for row in rows:
+            click.echo(
+                f"{'Would remove' if dry_run else 'Removing'} "
+                f"{table.name} {dict(row._mapping)}"
+            )
+        if dry_run:
+            click.echo(f"{len(rows)} duplicate rows in {table.name}.")
+            return
+
+        ids = [row.id for row in rows]
+        for start in range(0, len(ids), DEDUPLICATE_BATCH_SIZE):
+            conn.execute(
+                delete(table).where(
+                    table.c.id.in_(ids[start : start + DEDUPLICATE_BATCH_SIZE])
+                )
+            )
+        if index.name not in {i["name"] for i in inspect(conn).get_indexes(table.name)}:
+            index.create(bind=conn)
+
+    logging.warning(f"Removed {len(ids)} duplicate rows from {table.name}")
+    click.echo(
+        f"Removed {len(ids)} duplicate rows from {table.name}; {index_name} exists."
+    )
+
+
+def backfill_quiz_windows():
+    """Fill ``starts_at``/``ends_at`` for quizzes saved before those columns existed"""
+    quizzes = Quiz.query.filter(
+        Quiz.starts_at.is_(None), Quiz.date_of_quiz.isnot(None)
+    ).all()
+
+    for quiz in quizzes:
+        quiz.refresh_window()
+
+    if quizzes:
+        db.session.commit()
+        logging.info(f"Backfilled start/end window for {len(quizzes)} quizzes")
+
+
+def backfill_user_stats():
+    """Build the user stats rollups for databases graded before they existed"""
+    if UserStats.query.first() is None and Score.query.first() is not None:
+        rebuild_user_stats()
+
+
+def backfill_quiz_stats():
+    """Build the quiz stats and histograms for databases graded before they existed"""
+    if QuizStats.query.first() is None and Score.query.first() is not None:
+        rebuild_quiz_stats()
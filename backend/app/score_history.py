@@ -0,0 +1,94 @@
+from datetime import datetime, timedelta
+
+from app.models import Chapter, Quiz, Score, Subject, db
+
+# Cache tag of a user's score history responses, dropped when new scores for
+# the user are committed.
+SCORE_HISTORY_TAG = "scores:user:{identity}"
+
+
+def encode_cursor(timestamp, score_id):
+    """Opaque cursor pointing just past the given row"""
+    return f"{timestamp.isoformat()}_{score_id}"
+
+
+def decode_cursor(cursor):
+    """Inverse of ``encode_cursor``. Raises ValueError on a malformed cursor."""
+    timestamp, _, score_id = cursor.rpartition("_")
+    return datetime.fromisoformat(timestamp), int(score_id)
+
+
+def score_history(
+    user_id, subject_id=None, date_from=None, date_to=None, cursor=None, limit=None
+):
+    """Return a user's scores, newest first, with quiz, subject and chapter names.
+
+    All lookups are joined into a single query. Pass ``limit`` to page through
+    the history and ``cursor`` from the previous page to continue after it;
+    paging is keyed on (timestamp, id) so every page costs the same however
+    many attempts the user has.
+
+    Returns ``(scores, next_cursor)``; ``next_cursor`` is None on the last page.
+    """
+    query = (
+        db.session.query(
+            Score.id,
+            Score.quiz_id,
+            Score.score,
+            Score.timestamp,
+            Quiz.quiz_title,
+            Subject.name,
+            Chapter.name,
+        )
+        .outerjoin(Quiz, Quiz.id == Score.quiz_id)
+        .outerjoin(Subject, Subject.id == Quiz.subject_id)
+        .outerjoin(Chapter, Chapter.id == Quiz.chapter_id)
+        .filter(Score.user_id == user_id)
+    )
+
+    if subject_id is not None:
+        query = query.filter(Quiz.subject_id == subject_id)
+    if date_from:
+        query = query.filter(Score.timestamp >= date_from)
+    if date_to:
+        query = query.filter(Score.timestamp < date_to + timedelta(days=1))
+    if cursor:
+        timestamp, score_id = decode_cursor(cursor)
+        query = query.filter(
+            (Score.timestamp < timestamp)
+            | ((Score.timestamp == timestamp) & (Score.id < score_id))
+        )
+
+    query = query.order_by(Score.timestamp.desc(), Score.id.desc())
+    if limit is not None:
+        # One extra row tells us whether another page exists.
+        query = query.limit(limit + 1)
+
+    rows = query.all()
+    next_cursor = None
+    if limit is not None and len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_cursor(rows[-1].timestamp, rows[-1].id)
+
+    scores = [
+        {
+            "id": score_id,
+            "quiz_id": quiz_id,
+            "quiz_title": quiz_title,
+            "subject_name": subject_name,
+            "chapter_name": chapter_name,
+            "score": score,
+            "timestamp": timestamp.isoformat(),
+        }
+        for (
+            score_id,
+            quiz_id,
+            score,
+            timestamp,
+            quiz_title,
+            subject_name,
+            chapter_name,
+        ) in rows
+    ]
+
+    return scores, next_cursor
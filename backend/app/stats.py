@@ -0,0 +1,380 @@
+import logging
+
+import click
+from app.models import (
+    Quiz,
+    QuizResponse,
+    QuizScoreBin,
+    QuizStats,
+    Score,
+    UserStats,
+    UserSubjectStats,
+    db,
+    insert_for,
+)
+from flask.cli import with_appcontext
+from sqlalchemy import and_, case, func, insert, select
+
+# Rows per INSERT statement; keeps bound parameters well under SQLite's limit.
+STATS_UPSERT_BATCH_SIZE = 500
+
+# Score histogram: bins 0-9 are ten points wide, bin 10 holds perfect scores.
+HISTOGRAM_BINS = 11
+
+
+def score_bin(score):
+    """Histogram bin of a 0-100 score"""
+    return min(max(int(score), 0), 100) // 10
+
+
+def _score_bin_expr(column):
+    """SQL equivalent of ``score_bin``"""
+    return case(
+        (column >= 100, 10),
+        (column < 0, 0),
+        else_=column // 10,
+    )
+
+
+def _running_best(column, incoming):
+    return case(
+        (column.is_(None) | (incoming > column), incoming),
+        else_=column,
+    )
+
+
+def _running_worst(column, incoming):
+    return case(
+        (column.is_(None) | (incoming < column), incoming),
+        else_=column,
+    )
+
+
+def _upsert(model, index_elements, rows, additive, keep_max, keep_min):
+    """Merge ``rows`` into a rollup table, adding counters and keeping extremes"""
+    table = model.__table__
+
+    for start in range(0, len(rows), STATS_UPSERT_BATCH_SIZE):
+        stmt = insert_for(model).values(rows[start : start + STATS_UPSERT_BATCH_SIZE])
+        set_ = {name: table.c[name] + stmt.excluded[name] for name in additive}
+        set_.update(
+            {
+                name: _running_best(table.c[name], stmt.excluded[name])
+                for name in keep_max
+            }
+        )
+        set_.update(
+            {
+                name: _running_worst(table.c[name], stmt.excluded[name])
+                for name in keep_min
+            }
+        )
+        db.session.execute(
+            stmt.on_conflict_do_update(index_elements=index_elements, set_=set_)
+        )
+
+
+def record_scores(quiz, scores, graded_at):
+    """Fold newly inserted scores for ``quiz`` into the user and quiz rollups.
+
+    ``scores`` holds one dict per inserted ``Score`` with ``user_id``,
+    ``score``, ``questions_answered`` and ``correct_answers``. Runs in the
+    caller's transaction, so the rollups commit or roll back with the scores.
+    """
+    if not scores:
+        return
+
+    _upsert(
+        UserStats,
+        ["user_id"],
+        [
+            {
+                "user_id": result["user_id"],
+                "quizzes_taken": 1,
+                "total_points": result["score"],
+                "best_score": result["score"],
+                "worst_score": result["score"],
+                "perfect_scores": 1 if result["score"] == 100 else 0,
+                "questions_answered": result["questions_answered"],
+                "correct_answers": result["correct_answers"],
+                "last_attempt_at": graded_at,
+            }
+            for result in scores
+        ],
+        additive=[
+            "quizzes_taken",
+            "total_points",
+            "perfect_scores",
+            "questions_answered",
+            "correct_answers",
+        ],
+        keep_max=["best_score", "last_attempt_at"],
+        keep_min=["worst_score"],
+    )
+
+    _record_quiz_scores(quiz, scores)
+
+    if quiz.subject_id is None:
+        return
+
+    _upsert(
+        UserSubjectStats,
+        ["user_id", "subject_id"],
+        [
+            {
+                "user_id": result["user_id"],
+                "subject_id": quiz.subject_id,
+                "quizzes_taken": 1,
+                "total_points": result["score"],
+                "best_score": result["score"],
+                "worst_score": result["score"],
+                "last_attempt_at": graded_at,
+            }
+            for result in scores
+        ],
+        additive=["quizzes_taken", "total_points"],
+        keep_max=["best_score", "last_attempt_at"],
+        keep_min=["worst_score"],
+    )
+
+
+def _record_quiz_scores(quiz, scores):
+    values = [result["score"] for result in scores]
+
+    _upsert(
+        QuizStats,
+        ["quiz_id"],
+        [
+            {
+                "quiz_id": quiz.id,
+                "attempts": len(values),
+                "total_points": sum(values),
+                "min_score": min(values),
+                "max_score": max(values),
+            }
+        ],
+        additive=["attempts", "total_points"],
+        keep_max=["max_score"],
+        keep_min=["min_score"],
+    )
+
+    bins = [0] * HISTOGRAM_BINS
+    for value in values:
+        bins[score_bin(value)] += 1
+
+    _upsert(
+        QuizScoreBin,
+        ["quiz_id", "bin"],
+        [
+            {"quiz_id": quiz.id, "bin": index, "count": count}
+            for index, count in enumerate(bins)
+            if count
+        ],
+        additive=["count"],
+        keep_max=[],
+        keep_min=[],
+    )
+
+
+def load_histograms(quiz_ids):
+    """Return ``{quiz_id: [count per bin]}`` for the given quizzes in one query"""
+    histograms = {quiz_id: [0] * HISTOGRAM_BINS for quiz_id in quiz_ids}
+    if not histograms:
+        return histograms
+
+    for quiz_id, index, count in db.session.query(
+        QuizScoreBin.quiz_id, QuizScoreBin.bin, QuizScoreBin.count
+    ).filter(QuizScoreBin.quiz_id.in_(histograms)):
+        histograms[quiz_id][index] = count
+
+    return histograms
+
+
+def approximate_rank(histogram, score):
+    """Estimate the rank and percentile of ``score`` from a quiz histogram.
+
+    Scores are assumed to be spread evenly within a bin, so the estimate is
+    exact at bin edges and for perfect scores. Returns ``(rank, percentile,
+    attempts)`` where rank 1 is the best and percentile is the share of
+    attempts scoring below ``score``.
+    """
+    attempts = sum(histogram)
+    if not attempts:
+        return None, None, 0
+
+    index = score_bin(score)
+    in_bin = histogram[index]
+    width = 1 if index == 10 else 10
+    offset = min(max(int(score), 0), 100) - index * 10
+
+    above = sum(histogram[index + 1 :])
+    below = sum(histogram[:index])
+    if in_bin:
+        above += min(in_bin - 1, round(in_bin * (width - 1 - offset) / width))
+        below += min(in_bin - 1, round(in_bin * offset / width))
+
+    return above + 1, round(below / attempts * 100, 1), attempts
+
+
+def rebuild_user_stats():
+    """Recompute both rollup tables from ``Score`` and ``QuizResponse``.
+
+    Only responses to quizzes the user has a score for are counted, matching
+    what grading adds. Returns ``(users, user_subject_pairs)`` written.
+    """
+    responses = (
+        select(
+            QuizResponse.user_id.label("user_id"),
+            func.count(QuizResponse.id).label("answered"),
+            func.sum(case((QuizResponse.is_correct.is_(True), 1), else_=0)).label(
+                "correct"
+            ),
+        )
+        .join(
+            Score,
+            and_(
+                Score.user_id == QuizResponse.user_id,
+                Score.quiz_id == QuizResponse.quiz_id,
+            ),
+        )
+        .group_by(QuizResponse.user_id)
+        .subquery()
+    )
+
+    overall = (
+        select(
+            Score.user_id,
+            func.count(Score.id),
+            func.sum(Score.score),
+            func.max(Score.score),
+            func.min(Score.score),
+            func.sum(case((Score.score == 100, 1), else_=0)),
+            func.coalesce(func.max(responses.c.answered), 0),
+            func.coalesce(func.max(responses.c.correct), 0),
+            func.max(Score.timestamp),
+        )
+        .outerjoin(responses, responses.c.user_id == Score.user_id)
+        .where(Score.user_id.isnot(None))
+        .group_by(Score.user_id)
+    )
+
+    per_subject = (
+        select(
+            Score.user_id,
+            Quiz.subject_id,
+            func.count(Score.id),
+            func.sum(Score.score),
+            func.max(Score.score),
+            func.min(Score.score),
+            func.max(Score.timestamp),
+        )
+        .join(Quiz, Quiz.id == Score.quiz_id)
+        .where(Score.user_id.isnot(None), Quiz.subject_id.isnot(None))
+        .group_by(Score.user_id, Quiz.subject_id)
+    )
+
+    try:
+        db.session.query(UserSubjectStats).delete()
+        db.session.query(UserStats).delete()
+
+        users = db.session.execute(
+            insert(UserStats).from_select(
+                [
+                    "user_id",
+                    "quizzes_taken",
+                    "total_points",
+                    "best_score",
+                    "worst_score",
+                    "perfect_scores",
+                    "questions_answered",
+                    "correct_answers",
+                    "last_attempt_at",
+                ],
+                overall,
+            )
+        ).rowcount
+        pairs = db.session.execute(
+            insert(UserSubjectStats).from_select(
+                [
+                    "user_id",
+                    "subject_id",
+                    "quizzes_taken",
+                    "total_points",
+                    "best_score",
+                    "worst_score",
+                    "last_attempt_at",
+                ],
+                per_subject,
+            )
+        ).rowcount
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    logging.info(f"Rebuilt user stats for {users} users, {pairs} subject rows")
+    return users, pairs
+
+
+def rebuild_quiz_stats():
+    """Recompute ``QuizStats`` and the score histograms from ``Score``.
+
+    Returns the number of quizzes written.
+    """
+    overall = (
+        select(
+            Score.quiz_id,
+            func.count(Score.id),
+            func.sum(Score.score),
+            func.min(Score.score),
+            func.max(Score.score),
+        )
+        .where(Score.quiz_id.isnot(None), Score.score.isnot(None))
+        .group_by(Score.quiz_id)
+    )
+
+    score_bins = _score_bin_expr(Score.score)
+    histogram = (
+        select(Score.quiz_id, score_bins, func.count(Score.id))
+        .where(Score.quiz_id.isnot(None), Score.score.isnot(None))
+        .group_by(Score.quiz_id, score_bins)
+    )
+
+    try:
+        db.session.query(QuizScoreBin).delete()
+        db.session.query(QuizStats).delete()
+
+        quizzes = db.session.execute(
+            insert(QuizStats).from_select(
+                ["quiz_id", "attempts", "total_points", "min_score", "max_score"],
+                overall,
+            )
+        ).rowcount
+        db.session.execute(
+            insert(QuizScoreBin).from_select(["quiz_id", "bin", "count"], histogram)
+        )
+
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+    logging.info(f"Rebuilt quiz stats for {quizzes} quizzes")
+    return quizzes
+
+
+@click.command("rebuild-quiz-stats")
+@with_appcontext
+def rebuild_quiz_stats_command():
+    """Recompute the per-quiz statistics and score histograms from raw scores."""
+    quizzes = rebuild_quiz_stats()
+    click.echo(f"Rebuilt stats for {quizzes} quizzes.")
+
+
+@click.command("rebuild-user-stats")
+@with_appcontext
+def rebuild_user_stats_command():
+    """Recompute the per-user statistics rollups from raw scores."""
+    users, pairs = rebuild_user_stats()
+    click.echo(f"Rebuilt stats for {users} users ({pairs} user/subject rows).")
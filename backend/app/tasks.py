@@ -5,10 +5,27 @@ import logging
 from calendar import monthrange
 from datetime import datetime, timedelta
 
+from app.admin_dashboard import refresh_admin_dashboard_snapshot
 from app.agent.student_advisor import get_advisor
+from app.answers import (
+    flush_answer_buffer,
+    has_buffered_answers,
+    release_buffered_answers,
+    stage_buffered_answers,
+)
 from app.celery_app import celery_app
 from app.email import send_email, send_email_with_attachment
+from app.grading import grade_quiz
 from app.models import *
+from app.quiz_payload import warm_quiz_payload
+from app.rankings import leaderboard_ranks, publish_scores, refresh_user_averages
+from app.scheduler import (
+    finalization_queue,
+    schedule_quiz_finalization,
+    schedule_quiz_warmup,
+    warmup_queue,
+)
+from app.stats import approximate_rank, load_histograms
 
 
 def create_app_context():
@@ -25,7 +42,28 @@ def generate_user_stats_csv():
     app = create_app_context()
 
     with app.app_context():
-        users = User.query.all()
+        users = (
+            db.session.query(User, UserStats)
+            .outerjoin(UserStats, UserStats.user_id == User.id)
+            .order_by(User.id)
+            .all()
+        )
+
+        # Subject with the most graded attempts per user, ties to the first seen.
+        most_active_subjects = {}
+        subject_attempts = {}
+        for user_id, subject_name, quizzes_taken in (
+            db.session.query(
+                UserSubjectStats.user_id, Subject.name, UserSubjectStats.quizzes_taken
+            )
+            .join(Subject, Subject.id == UserSubjectStats.subject_id)
+            .order_by(UserSubjectStats.user_id, UserSubjectStats.subject_id)
+        ):
+            if quizzes_taken > subject_attempts.get(user_id, 0):
+                subject_attempts[user_id] = quizzes_taken
+                most_active_subjects[user_id] = subject_name
+
+        all_quizzes = Quiz.query.count()
 
         output = io.StringIO()
         writer = csv.writer(output)
@@ -44,38 +82,19 @@ def generate_user_stats_csv():
             ]
         )
 
-        for user in users:
-
-            scores = Score.query.filter_by(user_id=user.id).all()
+        for user, stats in users:
 
-            quizzes_taken = len(scores)
-            total_points = sum(score.score for score in scores) if scores else 0
-            avg_score = total_points / quizzes_taken if quizzes_taken > 0 else 0
+            quizzes_taken = stats.quizzes_taken if stats else 0
+            total_points = stats.total_points if stats else 0
+            avg_score = stats.average_score if stats else 0
 
-            last_quiz_date = (
-                max([score.timestamp for score in scores]) if scores else None
-            )
+            last_quiz_date = stats.last_attempt_at if stats else None
             last_quiz_date_str = (
                 last_quiz_date.strftime("%Y-%m-%d") if last_quiz_date else "N/A"
             )
 
-            subject_counts = {}
-            for score in scores:
-                quiz = Quiz.query.get(score.quiz_id)
-                if quiz and quiz.subject_id:
-                    subject = Subject.query.get(quiz.subject_id)
-                    if subject:
-                        subject_counts[subject.name] = (
-                            subject_counts.get(subject.name, 0) + 1
-                        )
+            most_active_subject = most_active_subjects.get(user.id, "N/A")
 
-            most_active_subject = (
-                max(subject_counts.items(), key=lambda x: x[1])[0]
-                if subject_counts
-                else "N/A"
-            )
-
-            all_quizzes = Quiz.query.count()
             completion_rate = (
                 (quizzes_taken / all_quizzes) * 100 if all_quizzes > 0 else 0
             )
@@ -145,200 +164,175 @@ def check_export_status(task_id):
 
 
 @celery_app.task
-def calculate_ended_quiz_scores():
-    """Calculate scores for all users who took quizzes that have ended"""
-    app = create_app_context()
+def finalize_due_quizzes():
+    """Enqueue one grading job for every quiz whose end time has passed.
 
-    with app.app_context():
+    Only reads the Redis delay queue, so idle ticks cost one call regardless
+    of how many quizzes exist.
+    """
+    quiz_ids = finalization_queue.pop_due()
 
-        now = datetime.now()
-        one_hour_ago = now - timedelta(hours=1)
+    for position, quiz_id in enumerate(quiz_ids):
+        try:
+            finalize_quiz.delay(int(quiz_id))
+        except Exception as e:
+            # pop_due already claimed these, so put the rest back for the
+            # next tick instead of losing them with the failed publish.
+            logging.error(f"Error enqueuing finalization of quiz {quiz_id}: {e}")
+            now = datetime.now()
+            for pending_id in quiz_ids[position:]:
+                finalization_queue.schedule(pending_id, now)
+            return {"quizzes_enqueued": position, "error": str(e)}
 
-        print(f"Running score calculation at {now.strftime('%Y-%m-%d %H:%M:%S')}")
+    return {"quizzes_enqueued": len(quiz_ids)}
 
-        ended_quizzes = []
 
-        quizzes = Quiz.query.all()
+@celery_app.task
+def finalize_quiz(quiz_id):
+    """Grade a single quiz once it has ended"""
+    app = create_app_context()
 
-        for quiz in quizzes:
+    with app.app_context():
+        now = datetime.now()
 
-            quiz_start = datetime.combine(quiz.date_of_quiz, quiz.time_of_day)
-            quiz_end = quiz_start + timedelta(minutes=quiz.time_duration)
+        quiz = Quiz.query.get(quiz_id)
+        if not quiz:
+            logging.info(f"Quiz {quiz_id} no longer exists, nothing to finalize")
+            return {"quiz_id": quiz_id, "status": "missing"}
 
-            if now < quiz_end:
-                print(
-                    f"Skipping quiz {quiz.quiz_title} (ID: {quiz.id}) - still in progress until {quiz_end}"
-                )
-                continue
+        if quiz.ends_at is None:
+            logging.info(f"Quiz {quiz_id} has no schedule, nothing to finalize")
+            return {"quiz_id": quiz_id, "status": "no schedule"}
 
-            if quiz_end <= now and quiz_end >= one_hour_ago:
-                ended_quizzes.append(quiz)
-                print(
-                    f"Found ended quiz: {quiz.quiz_title} (ID: {quiz.id}), ended at {quiz_end}"
-                )
+        if quiz.ends_at > now:
+            schedule_quiz_finalization(quiz)
+            logging.info(f"Quiz {quiz_id} now ends at {quiz.ends_at}, rescheduled")
+            return {"quiz_id": quiz_id, "status": "rescheduled"}
+
+        try:
+            # Buffered answers and the scores graded from them commit together
+            snapshots, _ = stage_buffered_answers(quiz_id)
+            results, verification = grade_quiz(quiz, now)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            logging.error(f"Error finalizing quiz {quiz_id}: {str(e)}")
+            finalization_queue.schedule(quiz_id, now + timedelta(minutes=1))
+            return {"quiz_id": quiz_id, "status": "retrying", "error": str(e)}
 
-        if not ended_quizzes:
-            print("No quizzes have ended in the specified time window")
-            return "No quizzes ended in the specified time window"
+        release_buffered_answers(quiz_id, snapshots)
+        if verification is None:
+            return {"quiz_id": quiz_id, "status": "no questions"}
+        publish_scores(quiz, results)
 
-        results = []
-        score_verification = {}
+        return {
+            "quiz_id": quiz_id,
+            "status": "graded",
+            "scores": results,
+            "verification": verification,
+        }
 
-        for quiz in ended_quizzes:
-            print(f"\n--- Processing Quiz: {quiz.quiz_title} (ID: {quiz.id}) ---")
 
-            questions = Question.query.filter_by(quiz_id=quiz.id).all()
-            total_questions = len(questions)
+# How far back schedule_quiz_finalizations looks for ended quizzes with
+# ungraded responses. Bounds the hourly scan to recent quizzes; a quiz that is
+# still ungraded after this long needs looking into rather than retrying.
+UNGRADED_LOOKBACK = timedelta(days=1)
 
-            if total_questions == 0:
-                print(f"Quiz {quiz.id} has no questions. Skipping...")
-                continue
 
-            print(f"Quiz has {total_questions} questions")
+@celery_app.task
+def schedule_quiz_finalizations():
+    """Re-queue grading for quizzes that have not ended or ended recently.
+
+    Safety net for quizzes created before the delay queue existed or whose
+    schedule was lost with Redis data. Payload warmups of quizzes that have
+    not started are re-queued the same way. Quizzes that ended within the
+    last UNGRADED_LOOKBACK and still have responses without a score, e.g.
+    because a worker died after claiming them, are queued to be graded
+    again; grading skips existing scores.
+    """
+    app = create_app_context()
+
+    with app.app_context():
+        now = datetime.now()
+        one_hour_ago = now - timedelta(hours=1)
 
-            user_ids = (
-                db.session.query(QuizResponse.user_id)
-                .filter_by(quiz_id=quiz.id)
-                .distinct()
-                .all()
+        scheduled = 0
+        for quiz in Quiz.not_ended(one_hour_ago):
+            schedule_quiz_finalization(quiz)
+            if quiz.starts_at > now:
+                schedule_quiz_warmup(quiz)
+            scheduled += 1
+
+        ungraded = [
+            quiz_id
+            for (quiz_id,) in db.session.query(QuizResponse.quiz_id)
+            .join(Quiz, Quiz.id == QuizResponse.quiz_id)
+            .filter(
+                Quiz.ends_at >= now - UNGRADED_LOOKBACK,
+                Quiz.ends_at <= one_hour_ago,
+                QuizResponse.user_id.isnot(None),
+                db.session.query(Question.id)
+                .filter(Question.quiz_id == QuizResponse.quiz_id)
+                .exists(),
+                ~db.session.query(Score.id)
+                .filter(
+                    Score.quiz_id == QuizResponse.quiz_id,
+                    Score.user_id == QuizResponse.user_id,
+                )
+                .exists(),
             )
-            user_ids = [uid[0] for uid in user_ids]
-
-            print(f"Found {len(user_ids)} users with responses for this quiz")
-
-            score_verification[quiz.id] = {
-                "quiz_title": quiz.quiz_title,
-                "total_questions": total_questions,
-                "total_users": len(user_ids),
-                "users_processed": 0,
-                "scores_created": 0,
-                "scores_updated": 0,
-                "scores_skipped": 0,
-                "users_with_issues": [],
-            }
-
-            for user_id in user_ids:
-                try:
-                    user = User.query.get(user_id)
-                    username = user.username if user else f"User ID: {user_id}"
-
-                    existing_score = Score.query.filter_by(
-                        user_id=user_id,
-                        quiz_id=quiz.id,
-                    ).first()
-
-                    if existing_score:
-                        print(
-                            f"  → Score already exists for user {username} on quiz {quiz.quiz_title}. Skipping calculation."
-                        )
-                        score_verification[quiz.id]["scores_skipped"] += 1
-                        score_verification[quiz.id]["users_processed"] += 1
-
-                        results.append(
-                            {
-                                "user_id": user_id,
-                                "username": username,
-                                "quiz_id": quiz.id,
-                                "quiz_title": quiz.quiz_title,
-                                "score": existing_score.score,
-                                "status": "skipped - already calculated",
-                            }
-                        )
-                        continue
+            .distinct()
+        ]
+        for quiz_id in ungraded:
+            finalization_queue.schedule(quiz_id, now)
 
-                    responses = QuizResponse.query.filter_by(
-                        quiz_id=quiz.id, user_id=user_id
-                    ).all()
-                    response_count = len(responses)
+        return {"quizzes_scheduled": scheduled, "ungraded_requeued": len(ungraded)}
 
-                    completion_status = (
-                        "complete"
-                        if response_count >= total_questions
-                        else "incomplete"
-                    )
-                    completion_pct = (response_count / total_questions) * 100
 
-                    print(
-                        f"User {username} ({user_id}): {response_count}/{total_questions} questions answered ({completion_pct:.1f}%)"
-                    )
+@celery_app.task
+def warm_due_quiz_payloads():
+    """Cache the payload of every quiz that is about to start"""
+    quiz_ids = warmup_queue.pop_due()
+    if not quiz_ids:
+        return {"payloads_warmed": 0}
 
-                    correct_answers = sum(1 for r in responses if r.is_correct)
+    app = create_app_context()
 
-                    score_value = int((correct_answers / total_questions) * 100)
+    with app.app_context():
+        warmed = sum(1 for quiz_id in quiz_ids if warm_quiz_payload(int(quiz_id)))
 
-                    print(
-                        f"  → {correct_answers} correct answers out of {total_questions}"
-                    )
-                    print(f"  → Final score: {score_value}%")
+        return {"payloads_warmed": warmed}
 
-                    new_score = Score(
-                        user_id=user_id,
-                        quiz_id=quiz.id,
-                        score=score_value,
-                        timestamp=now,
-                    )
-                    db.session.add(new_score)
-                    print(f"  → Created new score for {username}")
-                    score_verification[quiz.id]["scores_created"] += 1
 
-                    score_verification[quiz.id]["users_processed"] += 1
+@celery_app.task
+def refresh_user_average_index():
+    """Rebuild the sorted per-user averages used for percentile ranks"""
+    app = create_app_context()
 
-                    results.append(
-                        {
-                            "user_id": user_id,
-                            "username": username,
-                            "quiz_id": quiz.id,
-                            "quiz_title": quiz.quiz_title,
-                            "score": score_value,
-                            "correct_answers": correct_answers,
-                            "total_questions": total_questions,
-                            "questions_answered": response_count,
-                            "completion_status": completion_status,
-                            "completion_percentage": f"{completion_pct:.1f}%",
-                        }
-                    )
+    with app.app_context():
+        return {"users_indexed": refresh_user_averages()}
 
-                except Exception as e:
-                    print(
-                        f"Error processing user {user_id} for quiz {quiz.id}: {str(e)}"
-                    )
-                    score_verification[quiz.id]["users_with_issues"].append(
-                        {"user_id": user_id, "error": str(e)}
-                    )
 
-            try:
-                db.session.commit()
-                print(f"Committed scores for quiz {quiz.quiz_title}")
-            except Exception as e:
-                db.session.rollback()
-                print(f"Error committing scores for quiz {quiz.id}: {str(e)}")
-
-        verification_report = {
-            "timestamp": now.strftime("%Y-%m-%d %H:%M:%S"),
-            "quizzes_processed": len(ended_quizzes),
-            "total_scores_calculated": len(results),
-            "quiz_details": score_verification,
-        }
+@celery_app.task
+def refresh_admin_dashboard():
+    """Recompute the admin dashboard snapshot served to the admin pages"""
+    app = create_app_context()
 
-        try:
-            report_timestamp = now.strftime("%Y%m%d_%H%M%S")
-            report_filename = f"/tmp/score_calculation_report_{report_timestamp}.json"
+    with app.app_context():
+        stats = refresh_admin_dashboard_snapshot()
+        return {"generated_at": stats["generated_at"]}
 
-            with open(report_filename, "w") as f:
-                import json
 
-                json.dump(verification_report, f, indent=2)
+@celery_app.task
+def flush_answer_buffers():
+    """Drain answers buffered in Redis for live quizzes into the database"""
+    if not has_buffered_answers():
+        return {"answers_flushed": 0}
 
-            print(f"Score calculation report saved to {report_filename}")
-        except Exception as e:
-            print(f"Failed to save verification report: {str(e)}")
+    app = create_app_context()
 
-        return {
-            "message": f"Calculated scores for {len(results)} user-quiz combinations",
-            "quizzes_processed": len(ended_quizzes),
-            "scores": results,
-            "verification": verification_report,
-        }
+    with app.app_context():
+        return {"answers_flushed": flush_answer_buffer()}
 
 
 @celery_app.task
@@ -371,11 +365,8 @@ def send_daily_reminders():
         new_quizzes = Quiz.query.filter(Quiz.date_of_quiz >= yesterday).all()
         logging.info(f"Found {len(new_quizzes)} new quizzes since yesterday")
 
-        week_ahead = today + timedelta(days=7)
-        upcoming_quizzes = Quiz.query.filter(
-            Quiz.date_of_quiz >= today,
-            Quiz.date_of_quiz <= week_ahead,
-        ).all()
+        week_ahead = now + timedelta(days=7)
+        upcoming_quizzes = Quiz.upcoming(now, until=week_ahead).all()
         logging.info(f"Found {len(upcoming_quizzes)} upcoming quizzes")
 
         try:
@@ -645,22 +636,11 @@ def send_monthly_reports():
                 total_score = sum(score.score for score in monthly_scores)
                 average_score = total_score / total_quizzes if total_quizzes > 0 else 0
 
+                quiz_ranks = monthly_quiz_ranks(user.id, monthly_scores)
+
                 quiz_rankings = []
                 for score in monthly_scores:
-                    all_scores_for_quiz = (
-                        Score.query.filter_by(quiz_id=score.quiz_id)
-                        .order_by(Score.score.desc())
-                        .all()
-                    )
-                    user_rank = next(
-                        (
-                            i + 1
-                            for i, s in enumerate(all_scores_for_quiz)
-                            if s.user_id == user.id
-                        ),
-                        None,
-                    )
-                    total_participants = len(all_scores_for_quiz)
+                    user_rank, total_participants = quiz_ranks[score.quiz_id]
 
                     quiz_rankings.append(
                         {
@@ -788,22 +768,11 @@ def test_monthly_reports():
                 total_score = sum(score.score for score in monthly_scores)
                 average_score = total_score / total_quizzes if total_quizzes > 0 else 0
 
+                quiz_ranks = monthly_quiz_ranks(user.id, monthly_scores)
+
                 quiz_rankings = []
                 for score in monthly_scores:
-                    all_scores_for_quiz = (
-                        Score.query.filter_by(quiz_id=score.quiz_id)
-                        .order_by(Score.score.desc())
-                        .all()
-                    )
-                    user_rank = next(
-                        (
-                            i + 1
-                            for i, s in enumerate(all_scores_for_quiz)
-                            if s.user_id == user.id
-                        ),
-                        None,
-                    )
-                    total_participants = len(all_scores_for_quiz)
+                    user_rank, total_participants = quiz_ranks[score.quiz_id]
 
                     quiz_rankings.append(
                         {
@@ -848,6 +817,31 @@ def test_monthly_reports():
         return report_stats
 
 
+def monthly_quiz_ranks(user_id, scores):
+    """Return ``{quiz_id: (rank, participants)}`` for a user's scores.
+
+    Ranks come from the quiz leaderboards in one round trip, or from the
+    approximate histogram ranks if Redis is unavailable.
+    """
+    quiz_ids = [score.quiz_id for score in scores]
+
+    try:
+        ranks = leaderboard_ranks([("quiz", quiz_id) for quiz_id in quiz_ids], user_id)
+        return {
+            quiz_id: (rank, participants)
+            for (_, quiz_id), (rank, _, participants) in ranks.items()
+        }
+    except Exception as e:
+        logging.error(f"Leaderboard read failed, using approximate ranks: {e}")
+
+    histograms = load_histograms(quiz_ids)
+    quiz_ranks = {}
+    for score in scores:
+        rank, _, participants = approximate_rank(histograms[score.quiz_id], score.score)
+        quiz_ranks[score.quiz_id] = (rank, participants)
+    return quiz_ranks
+
+
 def calculate_improvement_trend(user_id, start_date, end_date):
     """Calculate if user is improving over the month"""
     scores = (
@@ -0,0 +1,181 @@
+import json
+import logging
+
+from app.cache import redis_client
+from app.models import Quiz
+
+# Every quiz that has an end time, stored once for all users as its
+# pre-serialized JSON scored by ``ends_at``. Upcoming and past are the two
+# sides of the current time, so the split moves with the clock and the set
+# only changes when a quiz is written. The members hash maps quiz id to its
+# current member so a quiz can be replaced in place, and the ready marker
+# tells an empty timeline apart from one that was never built. Every quiz
+# write bumps the generation, so a rebuild that read the database before a
+# write committed can tell and is not published.
+TIMELINE_KEY = "dashboard:timeline"
+TIMELINE_MEMBERS_KEY = "dashboard:timeline:members"
+TIMELINE_READY_KEY = "dashboard:timeline:ready"
+TIMELINE_GENERATION_KEY = "dashboard:timeline:generation"
+
+# Writes go through refresh_timeline_quiz, so this only bounds how long a quiz
+# changed outside the API can stay stale.
+TIMELINE_TTL = 24 * 60 * 60
+
+# Swap one quiz's member. Only the generation is bumped while the timeline is
+# not built, since the next read builds it from the database anyway.
+_REPLACE_SCRIPT = """
+redis.call('INCR', KEYS[4])
+if redis.call('EXISTS', KEYS[3]) == 0 then
+    return 0
+end
+local old = redis.call('HGET', KEYS[2], ARGV[1])
+if old then
+    redis.call('ZREM', KEYS[1], old)
+end
+if ARGV[2] == '' then
+    redis.call('HDEL', KEYS[2], ARGV[1])
+else
+    redis.call('ZADD', KEYS[1], ARGV[3], ARGV[2])
+    redis.call('HSET', KEYS[2], ARGV[1], ARGV[2])
+end
+return 1
+"""
+_replace_member = redis_client.register_script(_REPLACE_SCRIPT)
+
+# Publish a rebuilt timeline unless a quiz was written since the generation
+# ARGV[1] was read. ARGV[2] is the ready TTL, followed by (quiz id, member,
+# score) triples.
+_PUBLISH_SCRIPT = """
+if (redis.call('GET', KEYS[4]) or '0') ~= ARGV[1] then
+    return 0
+end
+redis.call('DEL', KEYS[1], KEYS[2])
+for i = 3, #ARGV, 3 do
+    redis.call('ZADD', KEYS[1], ARGV[i + 2], ARGV[i + 1])
+    redis.call('HSET', KEYS[2], ARGV[i], ARGV[i + 1])
+end
+redis.call('SET', KEYS[3], 1, 'EX', ARGV[2])
+return 1
+"""
+_publish_timeline = redis_client.register_script(_PUBLISH_SCRIPT)
+
+_TIMELINE_KEYS = [
+    TIMELINE_KEY,
+    TIMELINE_MEMBERS_KEY,
+    TIMELINE_READY_KEY,
+    TIMELINE_GENERATION_KEY,
+]
+
+
+def serialize_timeline_quiz(quiz):
+    return json.dumps(
+        {
+            "id": quiz.id,
+            "title": quiz.quiz_title,
+            "date_of_quiz": quiz.date_of_quiz.isoformat(),
+            "duration": quiz.time_duration,
+            "chapter": quiz.chapter_id,
+            "subject": quiz.subject_id,
+            "time_of_day": quiz.time_of_day.isoformat() if quiz.time_of_day else None,
+        },
+        separators=(",", ":"),
+    )
+
+
+def _timeline_entries():
+    """``[(quiz_id, member, score)]`` for every quiz with an end time"""
+    return [
+        (quiz.id, serialize_timeline_quiz(quiz), quiz.ends_at.timestamp())
+        for quiz in Quiz.query.filter(Quiz.ends_at.isnot(None)).order_by(
+            Quiz.ends_at, Quiz.id
+        )
+    ]
+
+
+def _split_entries(entries, cutoff):
+    return (
+        [member for _, member, score in entries if score > cutoff],
+        [member for _, member, score in entries if score <= cutoff],
+    )
+
+
+def rebuild_timeline():
+    """Build the shared timeline from the database.
+
+    The result is published in one atomic step, and only if no quiz was
+    written while the database was read; otherwise it is discarded and the
+    next read tries again. Returns the entries read either way.
+    """
+    generation = redis_client.get(TIMELINE_GENERATION_KEY) or "0"
+    entries = _timeline_entries()
+
+    args = [generation, TIMELINE_TTL]
+    for entry in entries:
+        args.extend(entry)
+    published = _publish_timeline(keys=_TIMELINE_KEYS, args=args)
+
+    if published:
+        logging.info(f"Rebuilt dashboard timeline with {len(entries)} quizzes")
+    else:
+        logging.info("Discarded dashboard timeline rebuild after a concurrent write")
+    return entries
+
+
+def timeline_split(now):
+    """Return ``(upcoming, past)`` lists of serialized quizzes at ``now``.
+
+    Upcoming quizzes have not ended yet, past quizzes ended at or before
+    ``now``; both are ordered by end time. Falls back to the database when
+    Redis is unavailable.
+    """
+    cutoff = now.timestamp()
+
+    try:
+        if not redis_client.exists(TIMELINE_READY_KEY):
+            return _split_entries(rebuild_timeline(), cutoff)
+
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.zrangebyscore(TIMELINE_KEY, f"({cutoff}", "+inf")
+        pipe.zrangebyscore(TIMELINE_KEY, "-inf", cutoff)
+        upcoming, past = pipe.execute()
+        return upcoming, past
+    except Exception as e:
+        print(f"Dashboard timeline read error: {e}")
+
+    return _split_entries(_timeline_entries(), cutoff)
+
+
+def refresh_timeline_quiz(quiz):
+    """Replace a quiz in the timeline after it was created or updated"""
+    if quiz.ends_at is None:
+        remove_timeline_quiz(quiz.id)
+        return
+
+    try:
+        _replace_member(
+            keys=_TIMELINE_KEYS,
+            args=[quiz.id, serialize_timeline_quiz(quiz), quiz.ends_at.timestamp()],
+        )
+    except Exception as e:
+        print(f"Dashboard timeline update error for quiz {quiz.id}: {e}")
+        invalidate_timeline()
+
+
+def remove_timeline_quiz(quiz_id):
+    """Drop a quiz from the timeline after it was deleted"""
+    try:
+        _replace_member(keys=_TIMELINE_KEYS, args=[quiz_id, "", 0])
+    except Exception as e:
+        print(f"Dashboard timeline update error for quiz {quiz_id}: {e}")
+        invalidate_timeline()
+
+
+def invalidate_timeline():
+    """Force the next read to rebuild the timeline"""
+    try:
+        pipe = redis_client.pipeline(transaction=True)
+        pipe.incr(TIMELINE_GENERATION_KEY)
+        pipe.delete(TIMELINE_READY_KEY)
+        pipe.execute()
+    except Exception as e:
+        print(f"Dashboard timeline invalidation error: {e}")
@@ -0,0 +1,121 @@
+from datetime import date, datetime, timedelta
+
+from app.models import Score, User, db
+from sqlalchemy import func
+
+GRANULARITIES = ("day", "week", "month")
+
+# Upper bound on buckets per request, e.g. a year of days.
+MAX_BUCKETS = 366
+
+
+def bucket_start(day, granularity):
+    """First day of the bucket containing ``day``; weeks start on Monday"""
+    if granularity == "week":
+        return day - timedelta(days=day.weekday())
+    if granularity == "month":
+        return day.replace(day=1)
+    return day
+
+
+def next_bucket(start, granularity):
+    if granularity == "week":
+        return start + timedelta(days=7)
+    if granularity == "month":
+        if start.month == 12:
+            return start.replace(year=start.year + 1, month=1)
+        return start.replace(month=start.month + 1)
+    return start + timedelta(days=1)
+
+
+def bucket_starts(first_day, last_day, granularity):
+    """Start of every bucket overlapping ``[first_day, last_day]``, oldest first"""
+    starts = []
+    start = bucket_start(first_day, granularity)
+    while start <= last_day:
+        starts.append(start)
+        start = next_bucket(start, granularity)
+    return starts
+
+
+def _bucket_expr(column, granularity):
+    """SQL expression for the bucket start of ``column`` as YYYY-MM-DD"""
+    if db.session.get_bind().dialect.name == "postgresql":
+        return func.to_char(func.date_trunc(granularity, column), "YYYY-MM-DD")
+    if granularity == "week":
+        return func.date(column, "-6 days", "weekday 1")
+    if granularity == "month":
+        return func.strftime("%Y-%m-01", column)
+    return func.date(column)
+
+
+def _grouped(columns, time_column, first_day, last_day, granularity, *criteria):
+    """``{bucket_start: row}`` of ``columns`` grouped by bucket, in one query"""
+    bucket = _bucket_expr(time_column, granularity)
+    rows = (
+        db.session.query(bucket, *columns)
+        .filter(
+            time_column >= datetime.combine(first_day, datetime.min.time()),
+            time_column
+            < datetime.combine(last_day + timedelta(days=1), datetime.min.time()),
+            *criteria,
+        )
+        .group_by(bucket)
+    )
+    return {date.fromisoformat(row[0]): row[1:] for row in rows}
+
+
+def activity_series(first_day, last_day, granularity="month"):
+    """Per-bucket activity between two dates, both inclusive.
+
+    Each bucket has its start date as ``period`` and counts new users,
+    attempts, average score and distinct active users. Buckets follow
+    calendar boundaries, the first and last are widened to whole buckets,
+    and buckets without activity are returned with zeros.
+    """
+    if granularity not in GRANULARITIES:
+        raise ValueError(f"granularity must be one of {', '.join(GRANULARITIES)}")
+
+    starts = bucket_starts(first_day, last_day, granularity)
+    if len(starts) > MAX_BUCKETS:
+        raise ValueError(f"range spans more than {MAX_BUCKETS} {granularity} buckets")
+    if not starts:
+        return []
+
+    range_start = starts[0]
+    range_end = next_bucket(starts[-1], granularity) - timedelta(days=1)
+
+    new_users = _grouped(
+        [func.count(User.id)],
+        User.created_at,
+        range_start,
+        range_end,
+        granularity,
+        User.role == "user",
+    )
+    attempts = _grouped(
+        [
+            func.count(Score.id),
+            func.avg(Score.score),
+            func.count(Score.user_id.distinct()),
+        ],
+        Score.timestamp,
+        range_start,
+        range_end,
+        granularity,
+    )
+
+    series = []
+    for start in starts:
+        (users,) = new_users.get(start, (0,))
+        count, average, active = attempts.get(start, (0, None, 0))
+        series.append(
+            {
+                "period": start.isoformat(),
+                "new_users": users,
+                "attempts": count,
+                "average_score": round(average, 2) if average is not None else 0,
+                "active_users": active,
+            }
+        )
+    return series
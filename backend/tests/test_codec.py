@@ -0,0 +1,39 @@
+import unittest
+from datetime import date, datetime
+
+from app import codec
+
+
+class CodecTest(unittest.TestCase):
+    def test_auto_prefers_msgpack(self):
+        # msgpack is a declared dependency, so "auto" must not fall back to a
+        # JSON serializer that turns dates into strings.
+        self.assertEqual(codec.SERIALIZER, codec.SERIALIZER_MSGPACK)
+
+    def test_round_trip_keeps_dates_typed(self):
+        value = {
+            "generated_at": datetime(2025, 7, 29, 5, 58, 50, 996282),
+            "day": date(2025, 7, 29),
+            "scores": [1, 2.5, None],
+        }
+
+        decoded = codec.decode_value(codec.encode_value(value))
+
+        self.assertEqual(decoded, value)
+        self.assertIsInstance(decoded["generated_at"], datetime)
+        self.assertIsInstance(decoded["day"], date)
+
+    def test_round_trip_compressed(self):
+        value = {"rows": [{"at": datetime(2025, 1, 1, 12, 0)}] * 500}
+
+        encoded = codec.encode_value(value)
+
+        self.assertNotEqual(encoded[0] & 0b111, codec.COMPRESSION_NONE)
+        self.assertEqual(codec.decode_value(encoded), value)
+
+    def test_reads_legacy_json(self):
+        self.assertEqual(codec.decode_value(b'{"a": [1, 2]}'), {"a": [1, 2]})
+
+
+if __name__ == "__main__":
+    unittest.main()